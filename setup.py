@@ -10,4 +10,9 @@ setup(
         "langchain-community",
     ],
     python_requires=">=3.8",
+    entry_points={
+        "console_scripts": [
+            "finscan-import=app.db.import_db:main",
+        ],
+    },
 ) 
\ No newline at end of file
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 
 from app.schema.processing_log import ProcessingLogRequest, ProcessingLogResponse, ProcessingLogDBResponse
-from app.schema.result_log import ResultLogRequest, ResultLogResponse, ResultLogDBResponse
+from app.schema.result_log import ResultLogRequest, ResultLogResponse, ResultLogError, ResultLogDBResponse
 from app.schema.audit_log import AuditLogResponse
 from app.schema.top_fish import TopFishResponse
+from app.schema.agent_stats import AgentStatsResponse
+from app.schema.job import JobResponse
+from app.schema.usage import UsageResponse
+from app.schema.cache_log import CacheLogDBResponse
 from app.service.processing_service import ProcessingService
-from app.service.audit_service import AuditService
-from app.db.database import get_db, ProcessingLog, ResultLog, CacheLog
+from app.service.audit_service import AuditService, PERIODS
+from app.service.log_service import LogService
+from app.service.job_service import JobService
+from app.setting.setting import LIMIT, PAGE_SIZE, MAX_PAGE_SIZE, AGENT_EXTRACT_TEXT, AGENT1, AGENT2, AGENT3
+from app.util.api_utils import get_circuit_breaker_stats, get_rate_limiter_stats
+from app.db.database import get_async_db, ProcessingLog, ResultLog, CacheLog
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api",
@@ -19,14 +31,32 @@ router = APIRouter(
 
 processing_service = ProcessingService()
 audit_service = AuditService()
+log_service = LogService()
+job_service = JobService(processing_service)
+
+async def list_logs(db: AsyncSession, response: Response, query, schema, limit: int, stream: bool):
+    """
+    Shared listing for the log endpoints: one keyset page with the next cursor
+    in the X-Next-Cursor header, or every matching row as NDJSON when stream is set.
+    """
+    if stream:
+        return StreamingResponse(
+            log_service.stream_ndjson(query, schema),
+            media_type="application/x-ndjson"
+        )
+
+    logs, next_cursor = await log_service.get_page(db, query, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return logs
 
 @router.post("/processing/log", response_model=ProcessingLogResponse)
-async def create_processing_log(request: ProcessingLogRequest, db: Session = Depends(get_db)):
+async def create_processing_log(request: ProcessingLogRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new processing log by running the input through all agents.
     """
     try:
-        result = processing_service.process_log(
+        result = await processing_service.process_log(
             request.original_description,
             request.no_peb,
             request.no_seri
@@ -36,23 +66,35 @@ async def create_processing_log(request: ProcessingLogRequest, db: Session = Dep
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/processing/logs", response_model=List[ProcessingLogDBResponse])
-async def get_processing_logs(db: Session = Depends(get_db)):
+async def get_processing_logs(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    no_peb: Optional[str] = None,
+    no_seri: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get all processing logs from the database.
+    Get processing logs ordered by id, one page after the after_id cursor.
+    Set stream=true to get every matching log as NDJSON instead.
     """
     try:
-        logs = db.query(ProcessingLog).all()
-        return logs
+        filters = {"no_peb": no_peb, "no_seri": no_seri}
+        query = log_service.build_query(ProcessingLog, filters, after_id, created_from, created_to)
+        return await list_logs(db, response, query, ProcessingLogDBResponse, limit, stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/processing/log/{log_id}", response_model=ProcessingLogDBResponse)
-async def get_processing_log(log_id: int, db: Session = Depends(get_db)):
+async def get_processing_log(log_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get a specific processing log by ID.
     """
     try:
-        log = db.query(ProcessingLog).filter(ProcessingLog.id == log_id).first()
+        log = await db.get(ProcessingLog, log_id)
         if not log:
             raise HTTPException(status_code=404, detail="Processing log not found")
         return log
@@ -60,12 +102,12 @@ async def get_processing_log(log_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/result/log", response_model=ResultLogResponse)
-async def create_result_log(request: ResultLogRequest, db: Session = Depends(get_db)):
+async def create_result_log(request: ResultLogRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new result log with agent agreement check.
     """
     try:
-        result = processing_service.process_result_log(
+        result = await processing_service.process_result_log(
             request.original_description,
             request.no_peb,
             request.no_seri
@@ -74,24 +116,78 @@ async def create_result_log(request: ResultLogRequest, db: Session = Depends(get
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/result/logs/batch", response_model=List[Union[ResultLogResponse, ResultLogError]])
+async def create_result_logs_batch(requests: List[ResultLogRequest]):
+    """
+    Create result logs for a batch of line items, e.g. a whole PEB declaration.
+    Line items that fail are returned with an error instead of a result log and are not saved.
+    """
+    try:
+        results = await processing_service.process_result_log_batch(requests)
+        return results
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: ResultLogRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue a result log request and return its job immediately.
+    Poll GET /api/jobs/{job_id} for the result.
+    """
+    try:
+        return await job_service.submit(db, request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the status of a queued job, with its result log once done.
+    """
+    job = await job_service.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/result/logs", response_model=List[ResultLogDBResponse])
-async def get_result_logs(db: Session = Depends(get_db)):
+async def get_result_logs(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    no_peb: Optional[str] = None,
+    no_seri: Optional[str] = None,
+    extracted_fish_name: Optional[str] = None,
+    flag: Optional[bool] = None,
+    from_cache: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get all result logs from the database.
+    Get result logs ordered by id, one page after the after_id cursor.
+    Set stream=true to get every matching log as NDJSON instead.
     """
     try:
-        logs = db.query(ResultLog).all()
-        return logs
+        filters = {
+            "no_peb": no_peb,
+            "no_seri": no_seri,
+            "extracted_fish_name": extracted_fish_name,
+            "flag": flag,
+            "from_cache": from_cache
+        }
+        query = log_service.build_query(ResultLog, filters, after_id, created_from, created_to)
+        return await list_logs(db, response, query, ResultLogDBResponse, limit, stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/result/log/{log_id}", response_model=ResultLogDBResponse)
-async def get_result_log(log_id: int, db: Session = Depends(get_db)):
+async def get_result_log(log_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get a specific result log by ID.
     """
     try:
-        log = db.query(ResultLog).filter(ResultLog.id == log_id).first()
+        log = await db.get(ResultLog, log_id)
         if not log:
             raise HTTPException(status_code=404, detail="Result log not found")
         return log
@@ -99,42 +195,53 @@ async def get_result_log(log_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/processing/log/{log_id}")
-async def delete_processing_log(log_id: int, db: Session = Depends(get_db)):
+async def delete_processing_log(log_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a specific processing log by ID.
     """
     try:
-        log = db.query(ProcessingLog).filter(ProcessingLog.id == log_id).first()
+        log = await db.get(ProcessingLog, log_id)
         if not log:
             raise HTTPException(status_code=404, detail="Processing log not found")
-        db.delete(log)
-        db.commit()
+        await db.delete(log)
+        audit_service.track(db, "processing_log", -1)
+        await audit_service.update_counters(db)
+        await db.commit()
         return {"message": "Processing log deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/result/log/{log_id}")
-async def delete_result_log(log_id: int, db: Session = Depends(get_db)):
+async def delete_result_log(log_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a specific result log by ID.
     """
     try:
-        log = db.query(ResultLog).filter(ResultLog.id == log_id).first()
+        log = await db.get(ResultLog, log_id)
         if not log:
             raise HTTPException(status_code=404, detail="Result log not found")
-        db.delete(log)
-        db.commit()
+        await db.delete(log)
+        audit_service.track(db, "result_log", -1)
+        if log.flag:
+            # Rows written before created_at existed can only be removed from the all-time bucket
+            audit_service.track_fish(
+                db, log.fish_name_english, log.fish_name_latin, -1,
+                identified_at=log.created_at,
+                periods=PERIODS if log.created_at else ("all",)
+            )
+        await audit_service.update_counters(db)
+        await db.commit()
         return {"message": "Result log deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/audit/latest", response_model=AuditLogResponse)
-async def get_latest_audit_log(db: Session = Depends(get_db)):
+async def get_latest_audit_log(db: AsyncSession = Depends(get_async_db)):
     """
     Get the latest audit log entry with current counts.
     """
     try:
-        audit_log = audit_service.get_latest_audit_log(db)
+        audit_log = await audit_service.get_latest_audit_log(db)
         return {
             "id": audit_log.id,
             "total_processing_logs": audit_log.total_processing_logs,
@@ -150,32 +257,63 @@ async def get_latest_audit_log(db: Session = Depends(get_db)):
             "total_cache_logs": 0
         }
 
-@router.get("/cache/logs", response_model=List[dict])
-async def get_cache_logs(db: Session = Depends(get_db)):
+@router.get("/cache/logs", response_model=List[CacheLogDBResponse])
+async def get_cache_logs(
+    response: Response,
+    after_id: Optional[int] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    extracted_fish_name: Optional[str] = None,
+    fish_name_latin: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get all cache logs from the database.
+    Get cache logs ordered by id, one page after the after_id cursor.
+    Set stream=true to get every matching log as NDJSON instead.
     """
     try:
-        logs = db.query(CacheLog).all()
-        return [
-            {
-                "id": log.id,
-                "extracted_fish_name": log.extracted_fish_name,
-                "fish_name_english": log.fish_name_english,
-                "fish_name_latin": log.fish_name_latin
-            }
-            for log in logs
-        ]
+        filters = {"extracted_fish_name": extracted_fish_name, "fish_name_latin": fish_name_latin}
+        query = log_service.build_query(CacheLog, filters, after_id)
+        return await list_logs(db, response, query, CacheLogDBResponse, limit, stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cache/stats", response_model=dict)
+async def get_cache_stats():
+    """
+    Get size and hit/miss counters of the in-memory cache tier and
+    how many identifications were coalesced into one in-flight run.
+    """
+    return {
+        **processing_service.cache_service.get_memory_cache_stats(),
+        "single_flight": processing_service.get_single_flight_stats()
+    }
+
+@router.get("/llm/breakers", response_model=dict)
+async def get_llm_breakers():
+    """
+    Get the circuit breaker state (closed, open or half_open) and failure counters per model.
+    """
+    return get_circuit_breaker_stats(list(dict.fromkeys([AGENT_EXTRACT_TEXT, AGENT1, AGENT2, AGENT3])))
+
+@router.get("/llm/rate-limits", response_model=dict)
+async def get_llm_rate_limits():
+    """
+    Get the current request rate, tokens, pause, queue depth and calls in flight per model.
+    """
+    return get_rate_limiter_stats(list(dict.fromkeys([AGENT_EXTRACT_TEXT, AGENT1, AGENT2, AGENT3])))
+
 @router.get("/result/top-fish", response_model=TopFishResponse)
-async def get_top_fish(db: Session = Depends(get_db)):
+async def get_top_fish(
+    period: Literal["all", "day", "week", "month"] = "all",
+    limit: int = Query(LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get the top 5 most frequently identified fish.
+    Get the most frequently identified fish of the current day, week, month or all time.
     """
     try:
-        top_fish = audit_service.get_top_fish(db)
+        top_fish = await audit_service.get_top_fish(db, period, limit)
         if not top_fish:
             return {"items": []}
         
@@ -193,4 +331,37 @@ async def get_top_fish(db: Session = Depends(get_db)):
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching top fish data: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/agent/stats", response_model=AgentStatsResponse)
+async def get_agent_stats(db: AsyncSession = Depends(get_async_db)):
+    """
+    Get call count, average latency, token usage and cost per agent model.
+    """
+    try:
+        return {"items": await audit_service.get_agent_stats(db)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching agent stats: {str(e)}"
+        )
+
+@router.get("/usage", response_model=UsageResponse)
+async def get_usage(
+    group_by: Literal["model", "day", "no_peb"] = "model",
+    no_peb: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get tokens and cost of the extraction and agent calls by model, day or declaration,
+    and an estimate of what cache hits saved.
+    """
+    try:
+        return await audit_service.get_usage(db, group_by, no_peb, created_from, created_to)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching usage: {str(e)}"
+        )
@@ -1,22 +1,48 @@
 import json
 import time
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from typing import Dict, Optional
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from app.api.api import router as api_router
-from app.setting.setting import AGENT1, AGENT2, AGENT3, AGENT_EXTRACT_TEXT
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.api import router as api_router, audit_service, job_service
+from app.db.database import AsyncSessionLocal
+from app.setting.setting import AGENT1, AGENT2, AGENT3, AGENT_EXTRACT_TEXT, AUDIT_SNAPSHOT_INTERVAL, JOB_WORKERS
+from app.util.llm_client import close_llm_client
+from app.util.metrics import registry as metrics_registry, http_request_duration
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+async def snapshot_audit_logs():
+    """Store a periodic audit_log snapshot of the maintained counters."""
+    while True:
+        await asyncio.sleep(AUDIT_SNAPSHOT_INTERVAL)
+        async with AsyncSessionLocal() as db:
+            await audit_service.snapshot_audit_log(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Seed row counters for tables created since the last start
+    async with AsyncSessionLocal() as db:
+        await audit_service.ensure_counters(db)
+    snapshot_task = asyncio.create_task(snapshot_audit_logs())
+    job_service.start_workers(JOB_WORKERS)
+    yield
+    await job_service.stop_workers()
+    snapshot_task.cancel()
+    # Release pooled LLM connections on shutdown
+    await close_llm_client()
+
 app = FastAPI(
     title="Fish Identification API",
     description="API for processing and analyzing fish identification data using multiple AI agents",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -34,6 +60,14 @@ async def log_requests(request: Request, call_next):
     response = await call_next(request)
     process_time = time.time() - start_time
     logger.info(f"{request.method} {request.url.path} completed in {process_time:.2f}s")
+    # Labelled by route template rather than URL so ids in paths do not create new series
+    route = request.scope.get("route")
+    http_request_duration.observe(
+        process_time,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
     return response
 
 # Health check endpoint
@@ -41,6 +75,11 @@ async def log_requests(request: Request, call_next):
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # Include routers
 app.include_router(api_router)
 
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import string
+import asyncio
+import logging
+import argparse
+import subprocess
+import httpx
+
+from app.benchmark.mock_openrouter import MockOpenRouterConfig, MockOpenRouterServer, MOCK_SPECIES
+
+# Never point this at the application database: every table in it is dropped and recreated
+LOAD_BENCHMARK_DATABASE_URL = os.getenv("LOAD_BENCHMARK_DATABASE_URL", "sqlite:///load_benchmark.db")
+BENCHMARK_RESULTS_PATH = os.getenv("BENCHMARK_RESULTS_PATH", "benchmark_results.jsonl")
+MOCK_PORT = 8765
+DEFAULT_CONCURRENCY = [1, 4, 16, 64]
+DEFAULT_REQUESTS = 200
+
+# Share of requests naming an already identified fish in each scenario
+SCENARIOS = {
+    "hit": 1.0,
+    "mixed": 0.8,
+    "miss": 0.0,
+}
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+def random_fish_name() -> str:
+    """A made-up name that neither the cache nor the fuzzy lookup can match."""
+    return "".join(random.choices(string.ascii_lowercase, k=10))
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except Exception:
+        return "unknown"
+
+async def run_level(client: httpx.AsyncClient, hit_ratio: float, concurrency: int, total: int) -> dict:
+    """Send total requests with concurrency clients and summarize their latencies."""
+    descriptions = [
+        f"Ikan {random.choice(list(MOCK_SPECIES))} {random.randint(1, 50)}kg" if random.random() < hit_ratio
+        else f"Ikan {random_fish_name()} 1kg"
+        for _ in range(total)
+    ]
+    latencies = []
+    errors = 0
+    cache_hits = 0
+
+    async def client_loop():
+        nonlocal errors, cache_hits
+        while descriptions:
+            description = descriptions.pop()
+            start = time.perf_counter()
+            response = await client.post("/api/result/log", json={
+                "original_description": description,
+                "no_peb": "BENCHMARK",
+                "no_seri": str(len(descriptions))
+            })
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+            elif response.json().get("from_cache"):
+                cache_hits += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "hit_rate": cache_hits / total,
+        "requests_per_second": total / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+async def run_benchmark(config: MockOpenRouterConfig, scenarios: list[str], concurrency_levels: list[int], total: int, port: int) -> list[dict]:
+    server = MockOpenRouterServer(config, port=port)
+    server.start()
+
+    # The app reads its configuration at import, so point it at the mock and the scratch database first
+    os.environ["OPENROUTER_API_BASE"] = server.url
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ["DATABASE_URL"] = LOAD_BENCHMARK_DATABASE_URL
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    from app.db.database import Base, engine
+    from app.app import app
+    logging.getLogger().setLevel(logging.WARNING)
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    results = []
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                # Identify the canned species once so hit requests find them cached
+                for fish_name in MOCK_SPECIES:
+                    await client.post("/api/result/log", json={
+                        "original_description": f"Ikan {fish_name}", "no_peb": "WARMUP", "no_seri": "0"
+                    })
+
+                for scenario in scenarios:
+                    for concurrency in concurrency_levels:
+                        calls_before = server.calls
+                        level = await run_level(client, SCENARIOS[scenario], concurrency, total)
+                        level["scenario"] = scenario
+                        level["llm_calls"] = server.calls - calls_before
+                        results.append(level)
+                        print_level(level)
+    finally:
+        server.stop()
+    return results
+
+def print_level(level: dict, previous: dict | None = None) -> None:
+    line = (
+        f"{level['scenario']:<7}{level['concurrency']:>6}{level['requests_per_second']:>10.1f}"
+        f"{level['p50_ms']:>10.0f}{level['p95_ms']:>10.0f}{level['p99_ms']:>10.0f}"
+        f"{level['errors']:>8}{level['hit_rate']:>9.0%}{level['llm_calls']:>8}"
+    )
+    if previous:
+        line += (
+            f"   p95 {level['p95_ms'] - previous['p95_ms']:+.0f} ms,"
+            f" {level['requests_per_second'] - previous['requests_per_second']:+.1f} req/s"
+        )
+    print(line, flush=True)
+
+def load_previous_run(path: str, commit: str) -> dict | None:
+    """Get the most recent stored run of a different commit."""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            run = json.loads(line)
+            if run["commit"] != commit:
+                previous = run
+    return previous
+
+def store_run(path: str, run: dict) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark of POST /api/result/log against a mock OpenRouter.")
+    parser.add_argument("--scenarios", default="hit,mixed,miss", help=f"Comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default=",".join(map(str, DEFAULT_CONCURRENCY)), help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Requests per scenario and concurrency level")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for the mock model latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock calls answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of mock calls answered with HTTP 429")
+    parser.add_argument("--port", type=int, default=MOCK_PORT, help="Port of the mock OpenRouter server")
+    parser.add_argument("--results", default=BENCHMARK_RESULTS_PATH, help="JSONL file the run is appended to")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+    config = MockOpenRouterConfig(
+        latency_scale=args.latency_scale,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    )
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    print(f"{'mix':<7}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'hits':>9}{'llm':>8}")
+    results = asyncio.run(run_benchmark(config, scenarios, concurrency_levels, args.requests, args.port))
+
+    commit = git_commit()
+    previous = load_previous_run(args.results, commit)
+    if previous:
+        print(f"\nCompared with {previous['commit']}:")
+        previous_levels = {(level["scenario"], level["concurrency"]): level for level in previous["results"]}
+        for level in results:
+            print_level(level, previous_levels.get((level["scenario"], level["concurrency"])))
+
+    store_run(args.results, {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "requests": args.requests,
+            "latency_scale": args.latency_scale,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+        },
+        "results": results,
+    })
+    print(f"\nResults appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import json
+import random
+import asyncio
+import logging
+import threading
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.requests import ClientDisconnect
+
+from app.setting.setting import AGENT_EXTRACT_TEXT, AGENT1, AGENT2, AGENT3
+from app.util.text_utils import tokenize_description, is_stop_token
+
+logger = logging.getLogger(__name__)
+
+# Mean response time per prompt type and model in milliseconds; each call varies by +-MOCK_LATENCY_JITTER.
+# Keyed by prompt type first, as the extraction model can also be an identification agent
+MOCK_MODEL_LATENCY_MS = {
+    "extraction": {
+        AGENT_EXTRACT_TEXT: 400,
+    },
+    "identification": {
+        AGENT1: 800,
+        AGENT2: 1200,
+        AGENT3: 1500,
+    },
+}
+MOCK_DEFAULT_LATENCY_MS = 800
+MOCK_LATENCY_JITTER = 0.2
+MOCK_COST_PER_TOKEN = 0.000002  # USD
+
+# Canned identifications; other names get a deterministic made-up species
+MOCK_SPECIES = {
+    "tongkol": ("Mackerel tuna", "Euthynnus affinis"),
+    "tenggiri": ("Narrow-barred Spanish mackerel", "Scomberomorus commerson"),
+    "cakalang": ("Skipjack tuna", "Katsuwonus pelamis"),
+    "kakap": ("Barramundi", "Lates calcarifer"),
+    "bawal": ("Silver pomfret", "Pampus argenteus"),
+    "kembung": ("Indian mackerel", "Rastrelliger kanagurta"),
+}
+
+class MockOpenRouterConfig:
+    """Behaviour of the mock server: latency per prompt type and model, error rate and latency scale."""
+    def __init__(
+        self,
+        model_latency_ms: dict[str, dict[str, float]] | None = None,
+        latency_scale: float = 1.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0
+    ):
+        self.model_latency_ms = model_latency_ms or {
+            prompt_type: dict(latencies) for prompt_type, latencies in MOCK_MODEL_LATENCY_MS.items()
+        }
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+
+    def latency(self, prompt_type: str, model: str) -> float:
+        """Seconds to wait before answering a prompt of prompt_type ("extraction" or "identification") to model."""
+        mean = self.model_latency_ms.get(prompt_type, {}).get(model, MOCK_DEFAULT_LATENCY_MS) * self.latency_scale
+        return max(0.0, random.uniform(1 - MOCK_LATENCY_JITTER, 1 + MOCK_LATENCY_JITTER) * mean) / 1000
+
+def last_input(prompt: str) -> str:
+    """Get the text of the last Input: "..." line, which the prompts end with."""
+    return prompt.rsplit('Input: "', 1)[-1].rsplit('"', 1)[0]
+
+def get_prompt_type(prompt: str) -> str:
+    """Tell extraction prompts from identification prompts; combined prompts identify too."""
+    return "extraction" if "product description parsing" in prompt else "identification"
+
+def extract_fish_name(description: str) -> str:
+    """Answer an extraction prompt like a well-behaved model: the first non-quantity, non-packaging word."""
+    tokens = [token for token in tokenize_description(description) if not is_stop_token(token)]
+    return tokens[0] if tokens else description
+
+def identify_fish(model: str, fish_name: str) -> dict:
+    """Answer an identification prompt in the JSON format extract_agent_content expects."""
+    fish_common_name, latin_name = MOCK_SPECIES.get(
+        fish_name.lower(),
+        (f"{fish_name.title()} fish", f"Piscis {fish_name.lower()}")
+    )
+    return {
+        "agent": model,
+        "fish_common_name": fish_common_name,
+        "latin_name": latin_name,
+        "reasoning": f"Mock identification of {fish_name}."
+    }
+
+def create_mock_openrouter(config: MockOpenRouterConfig) -> FastAPI:
+    """Create a fake OpenRouter app serving /api/v1/chat/completions."""
+    app = FastAPI(title="Mock OpenRouter")
+    app.state.calls = 0
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            # The app cancels agent calls still pending once the others agree
+            return Response(status_code=499)
+        model = body.get("model", "")
+        prompt = body["messages"][-1]["content"]
+        app.state.calls += 1
+
+        prompt_type = get_prompt_type(prompt)
+        await asyncio.sleep(config.latency(prompt_type, model))
+        if random.random() < config.rate_limit_rate:
+            return JSONResponse({"error": {"message": "Rate limit exceeded"}}, status_code=429, headers={"Retry-After": "1"})
+        if random.random() < config.error_rate:
+            return JSONResponse({"error": {"message": "Mock upstream error"}}, status_code=500)
+
+        if prompt_type == "extraction":
+            content = extract_fish_name(last_input(prompt))
+        elif "extracted_fish_name" in prompt:
+            # Combined pipeline mode: extract and identify in one answer
+            fish_name = extract_fish_name(last_input(prompt))
+            content = json.dumps({"extracted_fish_name": fish_name, **identify_fish(model, fish_name)})
+        else:
+            content = json.dumps(identify_fish(model, last_input(prompt)))
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = max(1, len(content) // 4)
+        return {
+            "id": f"mock-{app.state.calls}",
+            "model": model,
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "cost": (prompt_tokens + completion_tokens) * MOCK_COST_PER_TOKEN
+            }
+        }
+
+    return app
+
+class MockOpenRouterServer:
+    """Runs the mock OpenRouter app with uvicorn in a background thread."""
+    def __init__(self, config: MockOpenRouterConfig, host: str = "127.0.0.1", port: int = 8765):
+        self.app = create_mock_openrouter(config)
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def calls(self) -> int:
+        return self.app.state.calls
+
+    def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        logger.info(f"Mock OpenRouter listening on {self.url}.")
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join()
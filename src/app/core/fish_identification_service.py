@@ -1,14 +1,31 @@
 import os
 import json
 import re
+import time
 import logging
 from datetime import datetime
-from collections import Counter
+from collections import defaultdict
+from functools import partial
 from dotenv import load_dotenv
-import requests
+import asyncio
 
-from app.setting.setting import AGENT_EXTRACT_TEXT, AGENT1, AGENT2, AGENT3
+from app.setting.setting import (
+    AGENTS,
+    AGENT_WEIGHTS,
+    AGENT_COSTS,
+    AGENT_FALLBACKS,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    LATENCY_WINDOW_SIZE,
+    CONSENSUS_MODE,
+    CONSENSUS_ORDER,
+    CONSENSUS_INITIAL_AGENTS,
+    CONSENSUS_MIN_VOTES,
+)
 from app.util.load_prompt import load_prompt
+from app.util.api_utils import create_llm_request, make_llm_request, get_usage
+from app.util.latency_window import LatencyWindow
+from app.util.metrics import llm_fallbacks, consensus_runs, consensus_added_agents
 from app.schema.processing_log import AgentResult
 from app.schema.result_log import ResultLogResponse
 
@@ -17,9 +34,19 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 agent_prompt = load_prompt('agent')
+# Extracts the fish name from the raw description and identifies it in the same call
+agent_combined_prompt = load_prompt('agent_combined')
 api_key = os.getenv("OPENROUTER_API_KEY")
 api_base = os.getenv("OPENROUTER_API_BASE")
 
+# Latencies of recent agent calls per (pipeline mode, model), used to hedge and to order agents.
+# Extraction calls to the same models are not recorded, and neither are failed calls.
+latency_window = LatencyWindow(LATENCY_WINDOW_SIZE)
+
+def latency_key(model: str, combined: bool) -> tuple[str, str]:
+    """Key of an agent model's calls in latency_window; combined prompts are longer and slower."""
+    return ("combined" if combined else "two_step", model)
+
 class FishIdentificationService:
     def __init__(self):
         if not api_key or not api_base:
@@ -27,7 +54,7 @@ class FishIdentificationService:
             raise ValueError("Missing required environment variables for API key or base URL.")
         logger.info("FishIdentificationService initialized successfully.")
 
-    def create_agent(self, prompt_template: str, input_text: dict, model: str):
+    async def create_agent(self, prompt_template: str, input_text: dict, model: str):
         """
         Create an agent with the specified prompt template and model.
         """
@@ -36,71 +63,208 @@ class FishIdentificationService:
         for k, v in input_text.items():
             prompt = prompt.replace(f"{{{{ {k} }}}}", str(v))
 
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant"},
-                {"role": "user", "content": prompt}
-            ]
-        }
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        url = api_base.rstrip("/") + "/api/v1/chat/completions"
-
+        request_data = create_llm_request(prompt, model)
         try:
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
+            response = await make_llm_request(request_data)
             logger.info(f"Successfully received response from agent {model}.")
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error creating agent with model {model}: {str(e)}")
-            if e.response is not None:
-                logger.error(f"Response status code: {e.response.status_code}")
-                logger.error(f"Response text: {e.response.text}")
-            raise Exception(f"Error creating agent: {str(e)}")
+            return response
         except Exception as e:
-            logger.error(f"An unexpected error occurred while creating agent with model {model}: {str(e)}")
+            logger.error(f"Error creating agent with model {model}: {str(e)}")
             raise Exception(f"Error creating agent: {str(e)}")
 
-    def agent1(self, input_text: str):
-        """Create an agent using the model specified in AGENT1 setting."""
-        logger.info("Calling agent 1.")
-        return self.create_agent(agent_prompt, {
-            "agent_name": AGENT1,
-            "fish_input": input_text
-        }, AGENT1)
-
-    def agent2(self, input_text: str):
-        """Create an agent using the model specified in AGENT2 setting."""
-        logger.info("Calling agent 2.")
-        return self.create_agent(agent_prompt, {
-            "agent_name": AGENT2,
-            "fish_input": input_text
-        }, AGENT2)
-
-    def agent3(self, input_text: str):
-        """Create an agent using the model specified in AGENT3 setting."""
-        logger.info("Calling agent 3.")
-        return self.create_agent(agent_prompt, {
-            "agent_name": AGENT3,
-            "fish_input": input_text
-        }, AGENT3)
-
-    def extract_agent_content(self, response: dict) -> AgentResult:
-        """Extract the essential content from an agent's response."""
+    async def call_agent(
+        self,
+        model: str,
+        input_text: str,
+        combined: bool = False,
+        cancelled_calls: list[str] | None = None
+    ) -> tuple[str, dict]:
+        """
+        Call an identification agent, hedged with its fallback model from AGENT_FALLBACKS.
+        The fallback gets the same prompt when the model fails, or when it has not answered
+        within HEDGE_PERCENTILE of its recent latencies; the first answer wins and the other
+        call is cancelled.
+        With combined set, input_text is the original description and the agent also extracts the fish name.
+        The model of every call cancelled in flight is appended to cancelled_calls.
+
+        Returns:
+            Tuple of (model that answered, response)
+        """
+        models: dict[asyncio.Task, str] = {}
+
+        def record_latency(task: asyncio.Task, agent_model: str, started: float) -> None:
+            # Only completed calls: a call cancelled in flight would count as faster than it was
+            if not task.cancelled() and task.exception() is None:
+                latency_window.record(latency_key(agent_model, combined), time.perf_counter() - started)
+
+        def start(agent_model: str) -> asyncio.Task:
+            if combined:
+                task = asyncio.create_task(self.create_agent(agent_combined_prompt, {
+                    "agent_name": agent_model,
+                    "original_description": input_text
+                }, agent_model))
+            else:
+                task = asyncio.create_task(self.create_agent(agent_prompt, {
+                    "agent_name": agent_model,
+                    "fish_input": input_text
+                }, agent_model))
+            models[task] = agent_model
+            task.add_done_callback(partial(record_latency, agent_model=agent_model, started=time.perf_counter()))
+            return task
+
+        fallback_model = AGENT_FALLBACKS.get(model)
+        primary = start(model)
+        tasks = {primary}
+        try:
+            if not fallback_model or fallback_model == model:
+                return model, await primary
+
+            hedge_after = latency_window.percentile(latency_key(model, combined), HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES)
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if done and primary.exception() is None:
+                return model, primary.result()
+
+            reason = "error" if done else "hedge"
+            logger.info(f"Sending agent call for {model} to fallback {fallback_model} ({reason}).")
+            if done:
+                tasks = set()
+            fallback = start(fallback_model)
+            tasks.add(fallback)
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        llm_fallbacks.inc(model=model, reason=reason, winner="fallback" if task is fallback else "primary")
+                        return (fallback_model if task is fallback else model), task.result()
+            llm_fallbacks.inc(model=model, reason=reason, winner="none")
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+                # A primary awaited directly is already cancelled when this call is cancelled
+                if cancelled_calls is not None and (task.cancelled() or not task.done()):
+                    cancelled_calls.append(models[task])
+
+    def order_agents(self, combined: bool = False) -> list[int]:
+        """
+        Indexes into AGENTS in the order escalate mode calls them: cheapest first by AGENT_COSTS,
+        or fastest first by recent median latency in the pipeline mode; models without a cost
+        or latency come last.
+        """
+        def sort_key(index: int):
+            model = AGENTS[index]
+            if CONSENSUS_ORDER == "latency":
+                median = latency_window.percentile(latency_key(model, combined), 50)
+                return (median is None, median or 0.0, index)
+            cost = AGENT_COSTS.get(model)
+            return (cost is None, cost or 0.0, index)
+
+        return sorted(range(len(AGENTS)), key=sort_key)
+
+    async def run_agents(
+        self,
+        input_text: str,
+        combined: bool = False,
+        cancelled_calls: list[str] | None = None
+    ) -> list[AgentResult | None]:
+        """
+        Run the AGENTS until their answers reach agreement.
+        With combined set, input_text is the original description and every agent
+        also returns the fish name it extracted from it.
+
+        In "parallel" mode every agent starts at once. In "escalate" mode the first
+        CONSENSUS_INITIAL_AGENTS agents in order_agents() start, and one more agent starts
+        whenever the running ones have all answered without agreement or one of them fails.
+        Agents still running at agreement are cancelled; the model of every call cancelled
+        in flight, including hedges that lost, is appended to cancelled_calls.
+
+        Returns the results in AGENTS order; agents that were cancelled or never called are None.
+        """
+        order = self.order_agents(combined)
+        initial = len(order) if CONSENSUS_MODE == "parallel" else min(CONSENSUS_INITIAL_AGENTS, len(order))
+        logger.info(f"Running {initial} of {len(order)} agents ({CONSENSUS_MODE} mode).")
+        results: list[AgentResult | None] = [None] * len(AGENTS)
+        errors = []
+        tasks: dict[asyncio.Task, int] = {}
+        started_at: dict[int, float] = {}
+        pending: set[asyncio.Task] = set()
+
+        escalated = False
+
+        def start_next(reason: str | None = None) -> bool:
+            if len(tasks) == len(order):
+                return False
+            index = order[len(tasks)]
+            task = asyncio.create_task(self.call_agent(AGENTS[index], input_text, combined, cancelled_calls))
+            tasks[task] = index
+            started_at[index] = time.perf_counter()
+            pending.add(task)
+            if reason is not None:
+                consensus_added_agents.inc(mode=CONSENSUS_MODE, reason=reason)
+            return True
+
+        for _ in range(initial):
+            start_next()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                for task in done:
+                    index = tasks[task]
+                    try:
+                        answered_model, response = task.result()
+                        results[index] = self.extract_agent_content(response, answered_model, combined)
+                        results[index].latency_ms = (time.perf_counter() - started_at[index]) * 1000
+                    except Exception as e:
+                        logger.error(f"Agent {index + 1} failed: {str(e)}")
+                        errors.append(e)
+                        # A failed agent's vote is replaced right away
+                        start_next("error")
+
+                if any(result is not None for result in results) and self.check_agent_agreement(results)[0]:
+                    if pending:
+                        logger.info(f"Agreement reached, cancelling {len(pending)} pending agent call(s).")
+                    consensus_runs.inc(mode=CONSENSUS_MODE, outcome="agreed_escalated" if escalated else "agreed")
+                    return results
+                if not pending and start_next("disagreement"):
+                    escalated = True
+                    logger.info(f"Agents disagree, escalating to {AGENTS[tasks[next(iter(pending))]]}.")
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let the cancelled calls report themselves to cancelled_calls before returning
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        consensus_runs.inc(mode=CONSENSUS_MODE, outcome="disagreed")
+        if errors:
+            raise Exception(f"Error running agents: {str(errors[0])}")
+        return results
+
+    def extract_agent_content(self, response: dict, model: str, combined: bool = False) -> AgentResult:
+        """
+        Extract the essential content from an agent's response.
+        The result is attributed to model, the model that was called, not to the
+        agent name the model echoes back in its answer.
+        With combined set, an answer without an extracted fish name is an error.
+        """
         logger.info("Extracting content from agent response.")
         try:
             content = response['choices'][0]['message']['content']
             content = content.replace('```json', '').replace('```', '').strip()
             result = json.loads(content)
+            if combined and not result.get('extracted_fish_name'):
+                raise KeyError('extracted_fish_name')
             logger.info("Successfully extracted and parsed agent content.")
+            usage = get_usage(response, model)
             return AgentResult(
-                agent=result['agent'],
+                agent=model,
                 fish_common_name=result['fish_common_name'],
                 latin_name=result['latin_name'],
-                reasoning=result['reasoning']
+                reasoning=result['reasoning'],
+                extracted_fish_name=result.get('extracted_fish_name'),
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                cost=usage.cost
             )
         except (KeyError, IndexError, json.JSONDecodeError) as e:
             logger.error(f"Error extracting agent content: {str(e)}. Response: {response}")
@@ -135,9 +299,24 @@ class FishIdentificationService:
         
         return name.strip()
 
-    def check_agent_agreement(self, agent_results: list[AgentResult]) -> tuple[bool, str, str, str]:
-        """Check if at least 2 agents agree on the latin name."""
+    def check_agent_agreement(self, agent_results: list[AgentResult | None]) -> tuple[bool, str, str, str | None]:
+        """
+        Check if a latin name has at least CONSENSUS_MIN_VOTES votes, each agent's vote
+        weighted by AGENT_WEIGHTS (default 1).
+        agent_results are in AGENTS order as returned by run_agents, so a vote is weighted
+        by the agent that was called even when its fallback answered; None entries are skipped.
+
+        Returns:
+            Tuple of (flag, fish_common_name, latin_name, extracted_fish_name) of the majority agent;
+            extracted_fish_name is None outside the combined pipeline mode
+        """
         logger.info("Checking agent agreement.")
+        weighted_results = [
+            (result, AGENT_WEIGHTS.get(AGENTS[index], 1.0))
+            for index, result in enumerate(agent_results)
+            if result is not None
+        ]
+        agent_results = [result for result, _ in weighted_results]
         # Normalize and count occurrences of each latin name
         normalized_latin_names = [self.normalize_latin_name(result.latin_name) for result in agent_results if result.latin_name]
 
@@ -146,16 +325,19 @@ class FishIdentificationService:
             first_agent = agent_results[0] if agent_results else None
             common_name = first_agent.fish_common_name if first_agent else ""
             latin_name = first_agent.latin_name if first_agent else ""
-            return (False, common_name, latin_name, common_name)
+            return (False, common_name, latin_name, first_agent.extracted_fish_name if first_agent else None)
 
-        latin_name_counts = Counter(normalized_latin_names)
-        logger.info(f"Latin name counts: {latin_name_counts}")
-        
-        # Get the most common latin name
-        most_common_latin = latin_name_counts.most_common(1)[0]
-        
-        # Check if at least 2 agents agree
-        flag = most_common_latin[1] >= 2
+        latin_name_votes = defaultdict(float)
+        for result, weight in weighted_results:
+            if result.latin_name:
+                latin_name_votes[self.normalize_latin_name(result.latin_name)] += weight
+        logger.info(f"Latin name votes: {dict(latin_name_votes)}")
+
+        # Get the latin name with the most votes
+        most_common_latin = max(latin_name_votes.items(), key=lambda item: item[1])
+
+        # Check if the votes reach agreement
+        flag = most_common_latin[1] >= CONSENSUS_MIN_VOTES
         logger.info(f"Agreement check result: {flag}. Most common: '{most_common_latin[0]}' ({most_common_latin[1]} votes)")
         
         # Find the agent that provided the most common latin name
@@ -170,5 +352,5 @@ class FishIdentificationService:
             flag,
             majority_agent.fish_common_name,
             majority_agent.latin_name,  # Use the original (non-normalized) latin name
-            majority_agent.fish_common_name  # Using common name as extracted name
+            majority_agent.extracted_fish_name
         ) 
\ No newline at end of file
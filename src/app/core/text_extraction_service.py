@@ -3,7 +3,8 @@ import logging
 from dotenv import load_dotenv
 from app.setting.setting import AGENT_EXTRACT_TEXT
 from app.util.load_prompt import load_prompt
-from app.util.api_utils import create_llm_request, make_llm_request
+from app.util.api_utils import create_llm_request, make_llm_request, get_usage
+from app.schema.usage import LLMUsage
 
 load_dotenv()
 
@@ -20,7 +21,7 @@ class TextExtractionService:
             raise ValueError("Missing required environment variables for API key or base URL.")
         logger.info("TextExtractionService initialized successfully.")
 
-    def create_agent(self, prompt_template: str, input_text: dict, model: str):
+    async def create_agent(self, prompt_template: str, input_text: dict, model: str):
         """Create an agent with the specified prompt template and model."""
         logger.info(f"Creating text extraction agent with model: {model}")
         prompt = prompt_template
@@ -28,21 +29,26 @@ class TextExtractionService:
             prompt = prompt.replace(f"{{{{ {k} }}}}", str(v))
         request_data = create_llm_request(prompt, model)
         try:
-            response = make_llm_request(request_data)
+            response = await make_llm_request(request_data)
             logger.info(f"Successfully received response from text extraction agent {model}.")
             return response
         except Exception as e:
             logger.error(f"Error during text extraction agent call with model {model}: {str(e)}")
             raise
 
-    def extract_text(self, text: str) -> str:
+    async def extract_text(self, text: str) -> str:
         """Extract fish name from product description."""
+        extracted_text, _ = await self.extract_text_with_usage(text)
+        return extracted_text
+
+    async def extract_text_with_usage(self, text: str) -> tuple[str, LLMUsage]:
+        """Extract fish name from product description, with the token usage and cost of the call."""
         logger.info("Starting fish name extraction from product description.")
         try:
-            response = self.create_agent(extract_text_prompt, {"product_description": text}, AGENT_EXTRACT_TEXT)
+            response = await self.create_agent(extract_text_prompt, {"product_description": text}, AGENT_EXTRACT_TEXT)
             content = response['choices'][0]['message']['content']
             logger.info(f"Successfully extracted fish name: {content.strip()}")
-            return content.strip()
+            return content.strip(), get_usage(response, AGENT_EXTRACT_TEXT)
         except (KeyError, IndexError) as e:
             logger.error(f"Error extracting content from text extraction agent response: {str(e)}")
             raise Exception("Error parsing agent response")
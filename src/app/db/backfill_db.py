@@ -0,0 +1,156 @@
+import json
+import argparse
+from sqlalchemy import select, insert, update, inspect, text
+from app.db.database import engine, SessionLocal, ResultLog, CacheLog, DescriptionCacheLog, ProcessingLog, AgentResultLog
+from app.db.migrate_db import normalize_cache_logs
+from app.util.text_utils import normalize_description
+
+def backfill_description_cache():
+    """Populate description_cache_log from the descriptions already stored in result_log."""
+    db = SessionLocal()
+    try:
+        known = set(db.scalars(select(DescriptionCacheLog.normalized_description)))
+        added = 0
+        rows = db.execute(
+            select(ResultLog.original_description, ResultLog.extracted_fish_name)
+            .where(ResultLog.extracted_fish_name.isnot(None))
+            .order_by(ResultLog.id)
+            .execution_options(yield_per=1000)
+        )
+        for original_description, extracted_fish_name in rows:
+            normalized_description = normalize_description(original_description)
+            if not normalized_description or normalized_description in known:
+                continue
+            db.add(DescriptionCacheLog(
+                normalized_description=normalized_description,
+                extracted_fish_name=extracted_fish_name
+            ))
+            known.add(normalized_description)
+            added += 1
+        db.commit()
+        print(f"Added {added} description cache entries.")
+    finally:
+        db.close()
+
+def backfill_normalized_fish_names():
+    """
+    Fill cache_log.normalized_fish_name for rows created before the column existed.
+    Rows whose name normalizes to an already cached key are merged into that entry.
+    migrate_db does the same; this catches rows written by an older version after migrating.
+    """
+    with engine.begin() as connection:
+        normalized, merged = normalize_cache_logs(connection)
+        print(f"Normalized {normalized} cache entries, merged {merged} duplicates.")
+
+LEGACY_AGENT_COLUMNS = ["agent_1_result", "agent_2_result", "agent_3_result"]
+
+def has_legacy_agent_columns(connection) -> bool:
+    existing_columns = {column["name"] for column in inspect(connection).get_columns("processing_log")}
+    return set(LEGACY_AGENT_COLUMNS) <= existing_columns
+
+def find_unconverted_agent_results(connection) -> list[int]:
+    """Ids of processing logs with legacy agent results but neither agent_result rows nor a cache_log_id."""
+    has_legacy_result = " OR ".join(f"{column} IS NOT NULL" for column in LEGACY_AGENT_COLUMNS)
+    return list(connection.execute(text(
+        f"SELECT id FROM processing_log WHERE ({has_legacy_result}) AND cache_log_id IS NULL "
+        "AND NOT EXISTS (SELECT 1 FROM agent_result WHERE agent_result.processing_log_id = processing_log.id) "
+        "ORDER BY id"
+    )).scalars())
+
+def backfill_agent_results():
+    """
+    Convert the JSON strings of the legacy processing_log.agent_N_result columns into
+    agent_result rows, or a cache_log_id reference for cached entries.
+    Processing logs converted by an earlier run are skipped; the legacy columns are kept
+    until drop_legacy_agent_columns is run.
+    """
+    with engine.begin() as connection:
+        if not has_legacy_agent_columns(connection):
+            print("No legacy agent result columns found.")
+            return
+
+        cache_log_ids = dict(connection.execute(select(CacheLog.extracted_fish_name, CacheLog.id)).all())
+        converted = 0
+        rows = connection.execute(text(
+            f"SELECT id, {', '.join(LEGACY_AGENT_COLUMNS)} FROM processing_log WHERE cache_log_id IS NULL "
+            "AND NOT EXISTS (SELECT 1 FROM agent_result WHERE agent_result.processing_log_id = processing_log.id) "
+            "ORDER BY id"
+        )).all()
+        for processing_log_id, *legacy_results in rows:
+            results = [json.loads(result) if result else None for result in legacy_results]
+            cached = next((result for result in results if result and result.get("cached")), None)
+            if cached:
+                cache_log_id = cache_log_ids.get(cached.get("extracted_fish_name"))
+                if cache_log_id is None:
+                    continue
+                connection.execute(
+                    update(ProcessingLog)
+                    .where(ProcessingLog.id == processing_log_id)
+                    .values(cache_log_id=cache_log_id)
+                )
+            else:
+                agent_rows = [
+                    {
+                        "processing_log_id": processing_log_id,
+                        "agent_index": index,
+                        "model": result.get("agent"),
+                        "fish_common_name": result.get("fish_common_name"),
+                        "latin_name": result.get("latin_name"),
+                        "reasoning": result.get("reasoning"),
+                    }
+                    for index, result in enumerate(results, start=1)
+                    if result
+                ]
+                if agent_rows:
+                    connection.execute(insert(AgentResultLog), agent_rows)
+            converted += 1
+        print(f"Converted agent results of {converted} processing logs.")
+
+        unconverted = find_unconverted_agent_results(connection)
+        if unconverted:
+            print(f"{len(unconverted)} processing logs could not be converted (first ids: {unconverted[:10]}).")
+        print("Check the converted rows, then run make drop-legacy-columns to drop the legacy columns.")
+
+def drop_legacy_agent_columns(force: bool = False):
+    """
+    Drop the legacy processing_log.agent_N_result columns once backfill_agent_results has converted them.
+    Refuses while processing logs with unconverted legacy results remain, unless force is set.
+    """
+    with engine.begin() as connection:
+        if not has_legacy_agent_columns(connection):
+            print("No legacy agent result columns found.")
+            return
+
+        unconverted = find_unconverted_agent_results(connection)
+        if unconverted and not force:
+            print(
+                f"Not dropping: {len(unconverted)} processing logs have legacy agent results that were not converted "
+                f"(first ids: {unconverted[:10]}). Run make backfill-db first, or pass --force to drop them anyway."
+            )
+            return
+
+        for column in LEGACY_AGENT_COLUMNS:
+            connection.execute(text(f"ALTER TABLE processing_log DROP COLUMN {column}"))
+        print(f"Dropped {', '.join(LEGACY_AGENT_COLUMNS)}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill caches and agent_result rows from existing rows.")
+    parser.add_argument(
+        "--drop-legacy-columns",
+        action="store_true",
+        help="Only drop the legacy agent_N_result columns, after the backfill has been checked"
+    )
+    parser.add_argument("--force", action="store_true", help="Drop the legacy columns even if some rows were not converted")
+    args = parser.parse_args()
+
+    if args.drop_legacy_columns:
+        print("Dropping legacy agent result columns...")
+        drop_legacy_agent_columns(args.force)
+    else:
+        print("Backfilling description cache from result logs...")
+        backfill_description_cache()
+        print("Backfilling normalized fish names in cache logs...")
+        backfill_normalized_fish_names()
+        print("Converting legacy agent results to agent_result rows...")
+        backfill_agent_results()
+        print("Backfill completed!")
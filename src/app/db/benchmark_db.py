@@ -0,0 +1,137 @@
+import os
+import sys
+import random
+import statistics
+import time
+from datetime import timedelta
+from sqlalchemy import create_engine, select, func, insert
+from app.db.database import Base, ProcessingLog, ResultLog, get_jakarta_time
+
+# Never point this at the application database: every table in it is dropped and refilled
+BENCHMARK_DATABASE_URL = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///benchmark.db")
+BENCHMARK_ROWS = 1_000_000
+INSERT_CHUNK = 10_000
+RUNS = 5
+
+INDEXED_TABLES = (ResultLog.__table__, ProcessingLog.__table__)
+
+def generate_rows(total: int):
+    """Yield synthetic result/processing log pairs spread over a year of declarations."""
+    random.seed(42)
+    species = [(f"Fish {i}", f"Piscis {i}") for i in range(300)]
+    now = get_jakarta_time()
+    for i in range(total):
+        english, latin = random.choice(species)
+        no_peb = f"PEB{i // 20:07d}"
+        no_seri = str(i % 20 + 1)
+        created_at = now - timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+        yield (
+            {
+                "no_peb": no_peb,
+                "no_seri": no_seri,
+                "original_description": f"Ikan {english} {i % 50}kg",
+                "extracted_fish_name": english,
+                "fish_name_english": english,
+                "fish_name_latin": latin,
+                "flag": random.random() < 0.9,
+                "from_cache": random.random() < 0.7,
+                "created_at": created_at,
+            },
+            {
+                "no_peb": no_peb,
+                "no_seri": no_seri,
+                "original_description": english,
+                "created_at": created_at,
+            },
+        )
+
+def load_rows(engine, total: int):
+    """Insert the synthetic rows in chunks of INSERT_CHUNK."""
+    result_rows, processing_rows = [], []
+    with engine.begin() as connection:
+        for result_row, processing_row in generate_rows(total):
+            result_rows.append(result_row)
+            processing_rows.append(processing_row)
+            if len(result_rows) == INSERT_CHUNK:
+                connection.execute(insert(ResultLog), result_rows)
+                connection.execute(insert(ProcessingLog), processing_rows)
+                result_rows, processing_rows = [], []
+        if result_rows:
+            connection.execute(insert(ResultLog), result_rows)
+            connection.execute(insert(ProcessingLog), processing_rows)
+
+def benchmark_queries():
+    """Queries matching the real access patterns, keyed by label."""
+    last_day = get_jakarta_time() - timedelta(days=1)
+    return {
+        "result_log by no_peb + no_seri": select(ResultLog).where(
+            ResultLog.no_peb == "PEB0025000", ResultLog.no_seri == "7"
+        ),
+        "result_log agreed, one species": select(func.count(ResultLog.id)).where(
+            ResultLog.flag == True,
+            ResultLog.fish_name_english == "Fish 42",
+            ResultLog.fish_name_latin == "Piscis 42"
+        ),
+        "result_log created in last day": select(func.count(ResultLog.id)).where(
+            ResultLog.created_at >= last_day
+        ),
+        "processing_log by no_peb + no_seri": select(ProcessingLog).where(
+            ProcessingLog.no_peb == "PEB0025000", ProcessingLog.no_seri == "7"
+        ),
+        "processing_log created in last day": select(func.count(ProcessingLog.id)).where(
+            ProcessingLog.created_at >= last_day
+        ),
+    }
+
+def time_queries(engine) -> dict[str, float]:
+    """Median wall time in milliseconds of each benchmark query over RUNS runs."""
+    timings = {}
+    with engine.connect() as connection:
+        for label, query in benchmark_queries().items():
+            samples = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                connection.execute(query).all()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = statistics.median(samples)
+    return timings
+
+def benchmark_db(total: int = BENCHMARK_ROWS):
+    """
+    Load total rows into result_log and processing_log of a scratch database and
+    compare query times without and with the secondary indexes.
+    """
+    engine = create_engine(BENCHMARK_DATABASE_URL)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    print(f"Loading {total} rows into result_log and processing_log...")
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for table in INDEXED_TABLES:
+            for index in table.indexes:
+                index.drop(bind=connection)
+    load_rows(engine, total)
+    print(f"Loaded in {time.perf_counter() - start:.1f}s")
+
+    without_indexes = time_queries(engine)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for table in INDEXED_TABLES:
+            for index in table.indexes:
+                index.create(bind=connection)
+    print(f"Indexes built in {time.perf_counter() - start:.1f}s")
+
+    with_indexes = time_queries(engine)
+
+    print(f"\n{'query':<38}{'no index (ms)':>15}{'indexed (ms)':>15}")
+    for label in without_indexes:
+        print(f"{label:<38}{without_indexes[label]:>15.2f}{with_indexes[label]:>15.2f}")
+    engine.dispose()
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else BENCHMARK_ROWS
+    print(f"Benchmarking indexes on {BENCHMARK_DATABASE_URL}...")
+    benchmark_db(total)
+    print("Benchmark completed!")
@@ -1,23 +1,48 @@
 import os
 import pytz
 
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, String, Boolean, ForeignKey, Integer, DateTime, Sequence
+from sqlalchemy import create_engine, event, text, Column, String, Boolean, ForeignKey, Integer, Float, Date, DateTime, Sequence, Index, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, Session, relationship
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+def get_async_database_url(url: str) -> str:
+    """Swap the sync driver in DATABASE_URL for its asyncio counterpart."""
+    drivers = {
+        "postgresql+psycopg2://": "postgresql+asyncpg://",
+        "postgresql://": "postgresql+asyncpg://",
+        "sqlite://": "sqlite+aiosqlite://",
+    }
+    for sync_prefix, async_prefix in drivers.items():
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(DATABASE_URL)
+
+# Sync engine is used by the schema management scripts (init_db, drop_db, reset_db)
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine serves the request path
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+JAKARTA_TZ = pytz.timezone('Asia/Jakarta')
+
 def get_jakarta_time():
-    jakarta_tz = pytz.timezone('Asia/Jakarta')
-    return datetime.now(jakarta_tz)
+    return datetime.now(JAKARTA_TZ)
 
 class ProcessingLog(Base):
     __tablename__ = "processing_log"
@@ -26,9 +51,49 @@ class ProcessingLog(Base):
     no_peb = Column(String)
     no_seri = Column(String)
     original_description = Column(String)
-    agent_1_result = Column(String) # json result
-    agent_2_result = Column(String) # json result
-    agent_3_result = Column(String) # json result
+    cache_log_id = Column(Integer, ForeignKey("cache_log.id")) # set when answered from the cache instead of the agents
+    created_at = Column(DateTime(timezone=True), default=get_jakarta_time)
+
+    agent_results = relationship(
+        "AgentResultLog",
+        lazy="selectin",
+        order_by="AgentResultLog.agent_index",
+        cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        Index("ix_processing_log_no_peb_no_seri", "no_peb", "no_seri"),
+        Index("ix_processing_log_created_at", "created_at"),
+    )
+
+class AgentResultLog(Base):
+    __tablename__ = "agent_result"
+
+    id = Column(Integer, Sequence('agent_result_id_seq'), primary_key=True)
+    processing_log_id = Column(Integer, ForeignKey("processing_log.id", ondelete="CASCADE"), nullable=False, index=True)
+    agent_index = Column(Integer) # 1-based position of the agent in the run
+    model = Column(String)
+    fish_common_name = Column(String)
+    latin_name = Column(String)
+    reasoning = Column(String)
+    latency_ms = Column(Float)
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    cost = Column(Float) # USD, when the provider reports it
+    created_at = Column(DateTime(timezone=True), default=get_jakarta_time)
+
+    __table_args__ = (
+        # Per-model analytics, e.g. answers of one model for a species
+        Index("ix_agent_result_model_latin_name", "model", "latin_name"),
+    )
+
+class CancelledAgentCall(Base):
+    """An agent call cancelled in flight, a hedge that lost or an agent no longer needed after agreement."""
+    __tablename__ = "cancelled_agent_call"
+
+    id = Column(Integer, Sequence('cancelled_agent_call_id_seq'), primary_key=True)
+    model = Column(String)
+    created_at = Column(DateTime(timezone=True), default=get_jakarta_time, index=True)
 
 class ResultLog(Base):
     __tablename__ = "result_log"
@@ -42,15 +107,95 @@ class ResultLog(Base):
     fish_name_latin = Column(String)
     flag = Column(Boolean)
     from_cache = Column(Boolean, default=False)
+    # Usage of the extraction model call, empty when the name came from the description cache or dictionary
+    extraction_model = Column(String)
+    extraction_prompt_tokens = Column(Integer)
+    extraction_completion_tokens = Column(Integer)
+    extraction_cost = Column(Float)
+    created_at = Column(DateTime(timezone=True), default=get_jakarta_time)
+
+    __table_args__ = (
+        # Declaration lookups, agreed identifications per species, time ranges
+        Index("ix_result_log_no_peb_no_seri", "no_peb", "no_seri"),
+        Index("ix_result_log_flag_species", "flag", "fish_name_english", "fish_name_latin"),
+        Index("ix_result_log_created_at", "created_at"),
+    )
 
 class CacheLog(Base):
     __tablename__ = "cache_log"
     id = Column(Integer, Sequence('cache_log_id_seq'), primary_key=True)
     extracted_fish_name = Column(String, unique=True, index=True)
+    normalized_fish_name = Column(String) # normalize_fish_name(extracted_fish_name), the cache key
     fish_name_english = Column(String)
     fish_name_latin = Column(String)
     result_log_id = Column(Integer, ForeignKey("result_log.id"))
 
+    __table_args__ = (
+        # One entry per cache key; names that normalize the same are deduplicated on insert
+        Index("ux_cache_log_normalized_fish_name", "normalized_fish_name", unique=True),
+        # Trigram index for fuzzy lookups on Postgres, a plain index elsewhere
+        Index(
+            "ix_cache_log_normalized_fish_name_trgm",
+            "normalized_fish_name",
+            postgresql_using="gin",
+            postgresql_ops={"normalized_fish_name": "gin_trgm_ops"},
+        ),
+    )
+
+class DescriptionCacheLog(Base):
+    __tablename__ = "description_cache_log"
+    id = Column(Integer, Sequence('description_cache_log_id_seq'), primary_key=True)
+    normalized_description = Column(String, unique=True, index=True)
+    extracted_fish_name = Column(String)
+
+class LogCounter(Base):
+    __tablename__ = "log_counter"
+    name = Column(String, primary_key=True) # table name, e.g. "result_log"
+    value = Column(Integer, default=0, nullable=False)
+
+class FishCount(Base):
+    __tablename__ = "fish_count"
+    period = Column(String, primary_key=True) # "all", "day", "week" or "month"
+    period_start = Column(Date, primary_key=True) # first day of the bucket, ALL_TIME_START for "all"
+    fish_name_english = Column(String, primary_key=True)
+    fish_name_latin = Column(String, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        # Top-N of one bucket is an index range scan
+        Index("ix_fish_count_bucket_count", "period", "period_start", "count"),
+    )
+
+class Job(Base):
+    __tablename__ = "job"
+
+    id = Column(Integer, Sequence('job_id_seq'), primary_key=True)
+    status = Column(String, nullable=False, default="pending") # pending, running, done or failed
+    original_description = Column(String)
+    no_peb = Column(String)
+    no_seri = Column(String)
+    result_log_id = Column(Integer, ForeignKey("result_log.id"))
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=get_jakarta_time)
+    started_at = Column(DateTime(timezone=True)) # start of the current attempt, the worker's lease
+    finished_at = Column(DateTime(timezone=True))
+
+    result_log = relationship("ResultLog", lazy="selectin")
+
+    __table_args__ = (
+        # Workers claim the oldest pending job
+        Index("ix_job_status_id", "status", "id"),
+    )
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoint"
+
+    source = Column(String, primary_key=True) # absolute path of the imported file
+    byte_offset = Column(Integer, nullable=False, default=0) # position after the last imported record
+    records = Column(Integer, nullable=False, default=0) # records imported so far
+    updated_at = Column(DateTime(timezone=True), default=get_jakarta_time, onupdate=get_jakarta_time)
+
 class AuditLog(Base):
     __tablename__ = "audit_log"
     id = Column(DateTime, primary_key=True, default=get_jakarta_time)
@@ -58,6 +203,79 @@ class AuditLog(Base):
     total_result_logs = Column(Integer, default=0)
     total_cache_logs = Column(Integer, default=0)
 
+@event.listens_for(Base.metadata, "before_create")
+def create_extensions(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+def insert_ignore(dialect_name: str, model, index_elements: list[str] | None = None):
+    """
+    INSERT that silently skips rows violating a unique constraint, where the dialect supports it.
+    With index_elements only conflicts on that unique index are skipped.
+    """
+    if dialect_name == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    if dialect_name == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    return model.__table__.insert()
+
+def insert_or_increment(dialect_name: str, model, column: str):
+    """INSERT that adds the inserted value to column of an existing row with the same key, where the dialect supports it."""
+    if dialect_name in ("postgresql", "sqlite"):
+        dialect = postgresql if dialect_name == "postgresql" else sqlite
+        statement = dialect.insert(model)
+        return statement.on_conflict_do_update(
+            index_elements=[key.name for key in model.__table__.primary_key],
+            set_={column: getattr(model, column) + getattr(statement.excluded, column)},
+        )
+    return model.__table__.insert()
+
+def jakarta_date(dialect_name: str, column):
+    """SQL expression for the Asia/Jakarta calendar date of a timestamp column."""
+    if dialect_name == "postgresql":
+        return func.date(func.timezone(JAKARTA_TZ.zone, column))
+    # SQLite keeps the Jakarta wall-clock time written by get_jakarta_time without its offset
+    return func.date(column)
+
+def after_commit(db, callback) -> None:
+    """Run callback once the session's current transaction has been committed (dropped on rollback)."""
+    session = getattr(db, "sync_session", db)
+    session.info.setdefault("after_commit", []).append(callback)
+
+@event.listens_for(Session, "after_commit")
+def run_after_commit_callbacks(session):
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+@event.listens_for(Session, "after_rollback")
+def discard_after_commit_callbacks(session):
+    session.info.pop("after_commit", None)
+
+# Round-trip accounting: statements and commits sent to the database inside count_statements()
+_statement_counter: ContextVar[dict | None] = ContextVar("statement_counter", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter["statements"] += 1
+
+@event.listens_for(Engine, "commit")
+def count_commit(conn):
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter["commits"] += 1
+
+@contextmanager
+def count_statements():
+    """Count the database statements and commits issued by the enclosed block."""
+    counter = {"statements": 0, "commits": 0}
+    token = _statement_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _statement_counter.reset(token)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
 
@@ -66,4 +284,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db 
\ No newline at end of file
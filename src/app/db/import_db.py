@@ -0,0 +1,42 @@
+import os
+import sys
+import asyncio
+import argparse
+from app.service.import_service import ImportService
+from app.setting.setting import IMPORT_BATCH_SIZE, IMPORT_REJECTS_SUFFIX
+
+def print_progress(stats: dict):
+    print(
+        f"{stats['records']} records, {stats['skipped']} skipped, {stats['failed']} failed, "
+        f"{stats['records_per_second']:.1f} records/s, cache hit rate {stats['hit_rate']:.1%}",
+        flush=True
+    )
+
+async def import_db(path: str, batch_size: int, restart: bool, rejects: str | None, keep_going: bool) -> dict:
+    return await ImportService().import_file(
+        path, batch_size, restart, on_progress=print_progress, rejects_path=rejects, keep_going=keep_going
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Import result log requests from a JSONL or CSV file.")
+    parser.add_argument("path", help="File with original_description, no_peb and no_seri per record")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Records written per transaction and checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and import from the beginning")
+    parser.add_argument("--rejects", help=f"JSONL file for rejected records (default: PATH{IMPORT_REJECTS_SUFFIX})")
+    parser.add_argument("--keep-going", action="store_true", help="Reject the records of a batch that failed entirely instead of stopping")
+    args = parser.parse_args()
+
+    print(f"Importing {args.path}...")
+    try:
+        stats = asyncio.run(import_db(args.path, args.batch_size, args.restart, args.rejects, args.keep_going))
+    except Exception as e:
+        print(f"Import stopped: {str(e)}")
+        print("Run the same command again to resume after the last imported batch.")
+        sys.exit(1)
+    print(f"Import completed in {stats['elapsed']:.1f}s!")
+    if stats["failed"]:
+        rejects = args.rejects or f"{os.path.abspath(args.path)}{IMPORT_REJECTS_SUFFIX}"
+        print(f"{stats['failed']} rejected records were written to {rejects}; import that file to retry them.")
+
+if __name__ == "__main__":
+    main()
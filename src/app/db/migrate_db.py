@@ -0,0 +1,74 @@
+from sqlalchemy import inspect, text, select, update, delete
+from sqlalchemy.schema import CreateColumn
+from app.db.database import Base, engine, CacheLog, ProcessingLog, LogCounter
+from app.util.text_utils import normalize_fish_name
+
+def merge_cache_log(connection, duplicate_id: int, kept_id: int) -> None:
+    """Point the processing logs served by a duplicate cache_log row at the kept row and delete the duplicate."""
+    connection.execute(update(ProcessingLog).where(ProcessingLog.cache_log_id == duplicate_id).values(cache_log_id=kept_id))
+    connection.execute(delete(CacheLog).where(CacheLog.id == duplicate_id))
+    connection.execute(update(LogCounter).where(LogCounter.name == "cache_log").values(value=LogCounter.value - 1))
+
+def normalize_cache_logs(connection) -> tuple[int, int]:
+    """
+    Fill cache_log.normalized_fish_name for rows created before the column existed and merge
+    rows sharing a normalized name into the oldest one, so the unique index on the normalized
+    name can be created and every cached name is matched by it.
+    Returns the number of rows normalized and the number of rows merged.
+    """
+    kept = {}
+    normalized = merged = 0
+    rows = connection.execute(
+        select(CacheLog.id, CacheLog.extracted_fish_name, CacheLog.normalized_fish_name).order_by(CacheLog.id)
+    ).all()
+    for cache_log_id, extracted_fish_name, normalized_fish_name in rows:
+        if normalized_fish_name is None:
+            normalized_fish_name = normalize_fish_name(extracted_fish_name or "") or None
+            if normalized_fish_name is None:
+                continue
+            if normalized_fish_name not in kept:
+                connection.execute(
+                    update(CacheLog).where(CacheLog.id == cache_log_id).values(normalized_fish_name=normalized_fish_name)
+                )
+                normalized += 1
+        if normalized_fish_name in kept:
+            merge_cache_log(connection, cache_log_id, kept[normalized_fish_name])
+            merged += 1
+        else:
+            kept[normalized_fish_name] = cache_log_id
+    return normalized, merged
+
+def migrate_db():
+    """
+    Bring existing tables up to date with the models: create missing tables,
+    add missing columns, normalize cache_log names and create missing indexes.
+    Existing data is kept.
+    """
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    print(f"Adding column {table.name}.{column.name}")
+                    column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+
+        # Needs the normalized_fish_name column, and must run before its unique index is created
+        normalized, merged = normalize_cache_logs(connection)
+        if normalized or merged:
+            print(f"Normalized {normalized} cache entries, merged {merged} entries with a duplicate normalized name")
+
+        for table in Base.metadata.sorted_tables:
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    print(f"Creating index {index.name}")
+                    index.create(bind=connection)
+
+if __name__ == "__main__":
+    print("Migrating database...")
+    migrate_db()
+    print("Database migration completed!")
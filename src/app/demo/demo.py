@@ -12,9 +12,16 @@ def get_audit_logs():
     return response.json()
 
 def get_cache_logs():
-    """Get all cache logs"""
-    response = requests.get(f"{BASE_URL}/cache/logs")
-    return response.json()
+    """Get all cache logs, following the X-Next-Cursor header page by page"""
+    cache_logs = []
+    params = {}
+    while True:
+        response = requests.get(f"{BASE_URL}/cache/logs", params=params)
+        cache_logs.extend(response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            return cache_logs
+        params = {"after_id": next_cursor}
 
 def get_top_fish():
     """Get top 5 identified fish"""
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class AgentStatsItem(BaseModel):
+    model: str
+    calls: int
+    avg_latency_ms: Optional[float] = None
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+
+class AgentStatsResponse(BaseModel):
+    items: List[AgentStatsItem]
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+class CacheLogDBResponse(BaseModel):
+    id: int
+    extracted_fish_name: str
+    fish_name_english: str
+    fish_name_latin: str
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from app.schema.result_log import ResultLogDBResponse
+
+class JobResponse(BaseModel):
+    id: int
+    status: str  # pending, running, done or failed
+    attempts: int
+    result_log: Optional[ResultLogDBResponse] = None  # set once the job is done
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
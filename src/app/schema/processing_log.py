@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
+from datetime import datetime
 
 class ProcessingLogRequest(BaseModel):
     original_description: str
@@ -7,25 +8,42 @@ class ProcessingLogRequest(BaseModel):
     no_seri: str
 
 class AgentResult(BaseModel):
-    agent: str
+    agent: str  # model that answered, the fallback if the call was hedged
     fish_common_name: str
     latin_name: str
     reasoning: str
+    extracted_fish_name: Optional[str] = None  # only in the combined pipeline mode
+    latency_ms: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost: Optional[float] = None
+
+class AgentResultDBResponse(BaseModel):
+    agent_index: int
+    model: str
+    fish_common_name: Optional[str] = None
+    latin_name: Optional[str] = None
+    reasoning: Optional[str] = None
+    latency_ms: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost: Optional[float] = None
 
 class ProcessingLogResponse(BaseModel):
     id: int
     no_peb: str
     no_seri: str
     original_description: str
-    agent_1_result: AgentResult
-    agent_2_result: AgentResult
-    agent_3_result: AgentResult
+    agent_1_result: Optional[AgentResult] = None  # None if cancelled after agreement
+    agent_2_result: Optional[AgentResult] = None
+    agent_3_result: Optional[AgentResult] = None
+    agent_results: List[Optional[AgentResult]] = []  # every agent in AGENTS order, None if not called or cancelled
 
 class ProcessingLogDBResponse(BaseModel):
     id: int
     no_peb: str
     no_seri: str
     original_description: str
-    agent_1_result: str  # JSON string
-    agent_2_result: str  # JSON string
-    agent_3_result: str  # JSON string
\ No newline at end of file
+    cache_log_id: Optional[int] = None  # set when answered from the cache
+    agent_results: List[AgentResultDBResponse] = []
+    created_at: Optional[datetime] = None  # None for rows created before the column existed
@@ -1,4 +1,6 @@
 from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
 
 class ResultLogRequest(BaseModel):
     original_description: str
@@ -16,6 +18,13 @@ class ResultLogResponse(BaseModel):
     flag: bool
     from_cache: bool = False
 
+class ResultLogError(BaseModel):
+    """A batch line item that could not be identified and was not saved."""
+    no_peb: str
+    no_seri: str
+    original_description: str
+    error: str
+
 class ResultLogDBResponse(BaseModel):
     id: int
     no_peb: str
@@ -25,4 +34,9 @@ class ResultLogDBResponse(BaseModel):
     fish_name_english: str
     fish_name_latin: str
     flag: bool
-    from_cache: bool = False 
\ No newline at end of file
+    from_cache: bool = False
+    extraction_model: Optional[str] = None
+    extraction_prompt_tokens: Optional[int] = None
+    extraction_completion_tokens: Optional[int] = None
+    extraction_cost: Optional[float] = None
+    created_at: Optional[datetime] = None  # None for rows created before the column existed
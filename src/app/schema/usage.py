@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+class LLMUsage(BaseModel):
+    model: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost: Optional[float] = None  # USD, when the provider reports it
+
+class UsageItem(BaseModel):
+    key: str
+    calls: int
+    cancelled_calls: int = 0  # agent calls cancelled in flight, billed without reported usage
+    prompt_tokens: int
+    completion_tokens: int
+    cost: float
+
+class UsageResponse(BaseModel):
+    group_by: Literal["model", "day", "no_peb"]
+    items: List[UsageItem]
+    cache_hits: int
+    estimated_tokens_saved: int  # cache hits times the average tokens of an agent consensus
+    estimated_cost_saved: float
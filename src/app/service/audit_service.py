@@ -1,55 +1,200 @@
 import logging
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, select, update, delete, insert, case, literal, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.setting.setting import LIMIT
-from app.db.database import AuditLog, ProcessingLog, ResultLog, CacheLog
-from datetime import datetime
+from app.db.database import (
+    AuditLog,
+    ProcessingLog,
+    ResultLog,
+    CacheLog,
+    AgentResultLog,
+    CancelledAgentCall,
+    LogCounter,
+    FishCount,
+    get_jakarta_time,
+    JAKARTA_TZ,
+    insert_ignore,
+    insert_or_increment,
+    jakarta_date,
+)
 
 logger = logging.getLogger(__name__)
 
+# Tables whose row counts are kept in log_counter
+COUNTED_TABLES = {
+    "processing_log": ProcessingLog,
+    "result_log": ResultLog,
+    "cache_log": CacheLog,
+}
+
+# Buckets of the fish_count aggregate; "all" has a single bucket starting at ALL_TIME_START
+PERIODS = ("all", "day", "week", "month")
+ALL_TIME_START = date(1970, 1, 1)
+
+def get_period_start(period: str, moment: datetime) -> date:
+    """Get the first day of the period bucket that contains moment, in Jakarta time."""
+    if moment.tzinfo is not None:
+        # Postgres returns created_at in UTC; naive values from SQLite are already Jakarta wall time
+        moment = moment.astimezone(JAKARTA_TZ)
+    day = moment.date()
+    if period == "day":
+        return day
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return ALL_TIME_START
+
 class AuditService:
     def __init__(self):
         logger.info("AuditService initialized successfully.")
 
-    def get_latest_audit_log(self, db: Session) -> AuditLog:
+    def track(self, db: AsyncSession, table_name: str, delta: int = 1) -> None:
+        """
+        Record rows added to (or removed from) a counted table in the caller's transaction.
+        The counters themselves are written by update_counters.
+        """
+        deltas = db.sync_session.info.setdefault("counter_deltas", {})
+        deltas[table_name] = deltas.get(table_name, 0) + delta
+
+    def track_fish(
+        self,
+        db: AsyncSession,
+        fish_name_english: str,
+        fish_name_latin: str,
+        delta: int = 1,
+        identified_at: datetime | None = None,
+        periods: tuple[str, ...] = PERIODS
+    ) -> None:
+        """
+        Record an agreed identification for the fish_count aggregate in the caller's transaction.
+        Counts go to the bucket of each period containing identified_at (default now)
+        and are written by update_counters.
+        """
+        if not fish_name_english or not fish_name_latin:
+            return
+
+        identified_at = identified_at or get_jakarta_time()
+        deltas = db.sync_session.info.setdefault("fish_deltas", {})
+        for period in periods:
+            key = (period, get_period_start(period, identified_at), fish_name_english, fish_name_latin)
+            deltas[key] = deltas.get(key, 0) + delta
+
+    async def update_counters(self, db: AsyncSession) -> None:
+        """
+        Apply the deltas recorded with track and track_fish: one UPDATE of log_counter
+        and one upsert into fish_count.
+        Rows are locked in key order, so concurrent transactions touching the same
+        counters wait for each other instead of deadlocking on Postgres.
+        Must be called before the caller commits, so counters and rows change together.
+        """
+        deltas = {
+            name: delta
+            for name, delta in sorted(db.sync_session.info.pop("counter_deltas", {}).items())
+            if delta
+        }
+        if deltas:
+            # A single UPDATE locks rows in scan order, so take the locks in name order first
+            await db.execute(
+                select(LogCounter.name)
+                .where(LogCounter.name.in_(deltas))
+                .order_by(LogCounter.name)
+                .with_for_update()
+            )
+            await db.execute(
+                update(LogCounter)
+                .where(LogCounter.name.in_(deltas))
+                .values(value=LogCounter.value + case(deltas, value=LogCounter.name, else_=0))
+            )
+
+        fish_deltas = db.sync_session.info.pop("fish_deltas", {})
+        rows = [
+            {
+                "period": period,
+                "period_start": period_start,
+                "fish_name_english": fish_name_english,
+                "fish_name_latin": fish_name_latin,
+                "count": delta,
+            }
+            for (period, period_start, fish_name_english, fish_name_latin), delta in sorted(fish_deltas.items())
+            if delta
+        ]
+        if rows:
+            # Upserted in key order for the same reason
+            await db.execute(insert_or_increment(db.bind.dialect.name, FishCount, "count").values(rows))
+
+    async def get_counts(self, db: AsyncSession) -> dict[str, int]:
+        """Read the current row counts of all counted tables from log_counter."""
+        rows = (await db.execute(select(LogCounter.name, LogCounter.value))).all()
+        counts = dict.fromkeys(COUNTED_TABLES, 0)
+        counts.update({name: value for name, value in rows})
+        return counts
+
+    async def ensure_counters(self, db: AsyncSession, rebuild: bool = False) -> None:
+        """
+        Create missing log_counter rows, seeded with a one-off COUNT(*) of their table.
+        With rebuild=True every counter is recomputed, e.g. after rows were changed outside the API.
+        """
+        existing = set() if rebuild else set((await db.scalars(select(LogCounter.name))).all())
+        for name, model in COUNTED_TABLES.items():
+            if name in existing:
+                continue
+            total = await db.scalar(select(func.count()).select_from(model))
+            logger.info(f"Seeding counter '{name}' with {total}.")
+            if rebuild:
+                await db.execute(update(LogCounter).where(LogCounter.name == name).values(value=total))
+            await db.execute(insert_ignore(db.bind.dialect.name, LogCounter).values(name=name, value=total))
+            if name == "result_log":
+                await self.rebuild_fish_counts(db)
+        if "result_log" in existing and await db.scalar(select(FishCount.period).limit(1)) is None:
+            # Counters predate the fish_count aggregate
+            await self.rebuild_fish_counts(db)
+        await db.commit()
+
+    async def rebuild_fish_counts(self, db: AsyncSession) -> None:
+        """
+        Recompute the all-time fish_count bucket with a one-off GROUP BY over result_log.
+        Day, week and month buckets only count identifications made while they are maintained.
+        """
+        logger.info("Rebuilding all-time fish counts.")
+        await db.execute(delete(FishCount).where(FishCount.period == "all"))
+        await db.execute(
+            insert(FishCount).from_select(
+                ["period", "period_start", "fish_name_english", "fish_name_latin", "count"],
+                select(
+                    literal("all"),
+                    literal(ALL_TIME_START, FishCount.period_start.type),
+                    ResultLog.fish_name_english,
+                    ResultLog.fish_name_latin,
+                    func.count(ResultLog.id)
+                ).where(
+                    ResultLog.fish_name_english.isnot(None),
+                    ResultLog.fish_name_latin.isnot(None),
+                    ResultLog.flag == True
+                ).group_by(
+                    ResultLog.fish_name_english,
+                    ResultLog.fish_name_latin
+                )
+            )
+        )
+
+    async def get_latest_audit_log(self, db: AsyncSession) -> AuditLog:
         """
-        Get the latest audit log entry with current counts.
-        If no audit log exists, create a new one.
+        Get the current counts as an audit log entry.
+        Counts are read from the maintained counters, so the cost does not grow with table size.
         """
         logger.info("Getting latest audit log.")
         try:
-            # Get the latest audit log
-            latest_audit = db.query(AuditLog).order_by(AuditLog.id.desc()).first()
-            
-            # Get current counts
-            total_processing_logs = db.query(ProcessingLog).count()
-            total_result_logs = db.query(ResultLog).count()
-            total_cache_logs = db.query(CacheLog).count()
-            logger.info(f"Current counts: Processing={total_processing_logs}, Result={total_result_logs}, Cache={total_cache_logs}")
-
-            # If no audit log exists or counts have changed, create a new one
-            if not latest_audit or (
-                latest_audit.total_processing_logs != total_processing_logs or
-                latest_audit.total_result_logs != total_result_logs or
-                latest_audit.total_cache_logs != total_cache_logs
-            ):
-                logger.info("Creating new audit log entry.")
-                audit_log = AuditLog(
-                    total_processing_logs=total_processing_logs,
-                    total_result_logs=total_result_logs,
-                    total_cache_logs=total_cache_logs
-                )
-                db.add(audit_log)
-                db.commit()
-                db.refresh(audit_log)
-                logger.info("New audit log entry created.")
-                return audit_log
-            
-            logger.info("Returning existing audit log entry.")
-            return latest_audit
+            counts = await self.get_counts(db)
+            return AuditLog(
+                id=get_jakarta_time(),
+                total_processing_logs=counts["processing_log"],
+                total_result_logs=counts["result_log"],
+                total_cache_logs=counts["cache_log"]
+            )
         except Exception as e:
             logger.error(f"Error getting latest audit log: {str(e)}", exc_info=True)
-            db.rollback()
             # If there's an error, return a default audit log
             return AuditLog(
                 id=datetime.now(),
@@ -58,24 +203,53 @@ class AuditService:
                 total_cache_logs=0
             )
 
-    def get_top_fish(self, db: Session):
-        """Get top N identified fish based on result logs"""
-        logger.info("Getting top fish.")
+    async def snapshot_audit_log(self, db: AsyncSession) -> AuditLog | None:
+        """
+        Store the current counts in audit_log if they changed since the last snapshot.
+        Called periodically instead of once per request.
+        """
         try:
-            top_fish = db.query(
-                ResultLog.fish_name_english,
-                ResultLog.fish_name_latin,
-                func.count(ResultLog.id).label('count')
-            ).filter(
-                ResultLog.fish_name_english.isnot(None),
-                ResultLog.fish_name_latin.isnot(None),
-                ResultLog.flag == True
-            ).group_by(
-                ResultLog.fish_name_english,
-                ResultLog.fish_name_latin
+            counts = await self.get_counts(db)
+            latest_audit = await db.scalar(select(AuditLog).order_by(AuditLog.id.desc()).limit(1))
+            if latest_audit and (
+                latest_audit.total_processing_logs == counts["processing_log"] and
+                latest_audit.total_result_logs == counts["result_log"] and
+                latest_audit.total_cache_logs == counts["cache_log"]
+            ):
+                return None
+
+            logger.info("Creating new audit log snapshot.")
+            audit_log = AuditLog(
+                total_processing_logs=counts["processing_log"],
+                total_result_logs=counts["result_log"],
+                total_cache_logs=counts["cache_log"]
+            )
+            db.add(audit_log)
+            await db.commit()
+            return audit_log
+        except Exception as e:
+            logger.error(f"Error creating audit log snapshot: {str(e)}", exc_info=True)
+            await db.rollback()
+            return None
+
+    async def get_top_fish(self, db: AsyncSession, period: str = "all", limit: int = LIMIT):
+        """
+        Get top N identified fish of the current day, week, month or all time.
+        Reads one bucket of the fish_count aggregate, so the cost does not grow with result_log.
+        """
+        logger.info(f"Getting top {limit} fish for period '{period}'.")
+        try:
+            top_fish = (await db.execute(select(
+                FishCount.fish_name_english,
+                FishCount.fish_name_latin,
+                FishCount.count
+            ).where(
+                FishCount.period == period,
+                FishCount.period_start == get_period_start(period, get_jakarta_time()),
+                FishCount.count > 0
             ).order_by(
-                func.count(ResultLog.id).desc()
-            ).limit(LIMIT).all()
+                FishCount.count.desc()
+            ).limit(limit))).all()
 
             result = []
             for fish in top_fish:
@@ -88,4 +262,133 @@ class AuditService:
             return result
         except Exception as e:
             logger.error(f"Error in get_top_fish: {str(e)}", exc_info=True)
-            return [] 
\ No newline at end of file
+            return []
+
+    async def get_agent_stats(self, db: AsyncSession):
+        """Get call count, average latency, token usage and cost per agent model"""
+        logger.info("Getting agent stats.")
+        try:
+            rows = (await db.execute(select(
+                AgentResultLog.model,
+                func.count(AgentResultLog.id).label('calls'),
+                func.avg(AgentResultLog.latency_ms).label('avg_latency_ms'),
+                func.coalesce(func.sum(AgentResultLog.prompt_tokens), 0).label('prompt_tokens'),
+                func.coalesce(func.sum(AgentResultLog.completion_tokens), 0).label('completion_tokens'),
+                func.coalesce(func.sum(AgentResultLog.cost), 0).label('cost')
+            ).group_by(
+                AgentResultLog.model
+            ).order_by(
+                AgentResultLog.model
+            ))).all()
+            return [row._asdict() for row in rows]
+        except Exception as e:
+            logger.error(f"Error in get_agent_stats: {str(e)}", exc_info=True)
+            return []
+
+    async def record_cancelled_agent_calls(self, db: AsyncSession, models: list[str]) -> None:
+        """Stage a cancelled_agent_call row per model in the caller's transaction."""
+        if models:
+            await db.execute(insert(CancelledAgentCall), [{"model": model} for model in models])
+
+    async def get_usage(
+        self,
+        db: AsyncSession,
+        group_by: str = "model",
+        no_peb: str | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None
+    ) -> dict:
+        """
+        Get tokens and cost of every LLM call, extraction and agents, grouped by model, Jakarta day or no_peb,
+        and an estimate of what cache hits saved at the average cost of an agent consensus.
+        Agent calls cancelled in flight are counted as cancelled_calls; their tokens and cost are
+        unknown, and they are not attributed to a no_peb.
+        Args:
+            group_by: "model", "day" or "no_peb"
+            no_peb: Only count calls made for this declaration
+            created_from: Only count calls made at or after this time
+            created_to: Only count calls made before this time
+        Returns:
+            Dict with group_by, items, cache_hits, estimated_tokens_saved and estimated_cost_saved
+        """
+        logger.info(f"Getting LLM usage by {group_by}.")
+        try:
+            calls = union_all(
+                select(
+                    AgentResultLog.model.label('model'),
+                    ProcessingLog.no_peb.label('no_peb'),
+                    AgentResultLog.created_at.label('created_at'),
+                    AgentResultLog.processing_log_id.label('processing_log_id'),
+                    AgentResultLog.prompt_tokens.label('prompt_tokens'),
+                    AgentResultLog.completion_tokens.label('completion_tokens'),
+                    AgentResultLog.cost.label('cost'),
+                    literal(0).label('cancelled')
+                ).join(ProcessingLog, AgentResultLog.processing_log_id == ProcessingLog.id),
+                select(
+                    ResultLog.extraction_model,
+                    ResultLog.no_peb,
+                    ResultLog.created_at,
+                    literal(None).label('processing_log_id'),
+                    ResultLog.extraction_prompt_tokens,
+                    ResultLog.extraction_completion_tokens,
+                    ResultLog.extraction_cost,
+                    literal(0)
+                ).where(ResultLog.extraction_model.is_not(None)),
+                # Calls cancelled in flight are billed, but their usage is never returned
+                select(
+                    CancelledAgentCall.model,
+                    literal(None),
+                    CancelledAgentCall.created_at,
+                    literal(None),
+                    literal(None),
+                    literal(None),
+                    literal(None),
+                    literal(1)
+                )
+            ).subquery()
+
+            def in_range(query, no_peb_column, created_at_column):
+                if no_peb is not None:
+                    query = query.where(no_peb_column == no_peb)
+                if created_from is not None:
+                    query = query.where(created_at_column >= created_from)
+                if created_to is not None:
+                    query = query.where(created_at_column < created_to)
+                return query
+
+            key = {
+                "model": calls.c.model,
+                "day": jakarta_date(db.bind.dialect.name, calls.c.created_at),
+                "no_peb": calls.c.no_peb,
+            }[group_by]
+            rows = (await db.execute(in_range(select(
+                key.label('key'),
+                func.sum(1 - calls.c.cancelled).label('calls'),
+                func.sum(calls.c.cancelled).label('cancelled_calls'),
+                func.coalesce(func.sum(calls.c.prompt_tokens), 0).label('prompt_tokens'),
+                func.coalesce(func.sum(calls.c.completion_tokens), 0).label('completion_tokens'),
+                func.coalesce(func.sum(calls.c.cost), 0).label('cost')
+            ), calls.c.no_peb, calls.c.created_at).group_by(key).order_by(key))).all()
+
+            # Average usage of one agent consensus, i.e. what a cache hit does not spend
+            identifications, agent_tokens, agent_cost = (await db.execute(in_range(select(
+                func.count(func.distinct(calls.c.processing_log_id)),
+                func.coalesce(func.sum(calls.c.prompt_tokens + calls.c.completion_tokens), 0),
+                func.coalesce(func.sum(calls.c.cost), 0)
+            ).where(calls.c.processing_log_id.is_not(None)), calls.c.no_peb, calls.c.created_at))).one()
+            cache_hits = await db.scalar(in_range(
+                select(func.count(ResultLog.id)).where(ResultLog.from_cache.is_(True)),
+                ResultLog.no_peb,
+                ResultLog.created_at
+            ))
+
+            return {
+                "group_by": group_by,
+                "items": [{**row._asdict(), "key": str(row.key)} for row in rows],
+                "cache_hits": cache_hits,
+                "estimated_tokens_saved": round(cache_hits * agent_tokens / identifications) if identifications else 0,
+                "estimated_cost_saved": cache_hits * agent_cost / identifications if identifications else 0.0,
+            }
+        except Exception as e:
+            logger.error(f"Error in get_usage: {str(e)}", exc_info=True)
+            raise Exception(f"Error in get_usage: {str(e)}")
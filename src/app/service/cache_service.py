@@ -1,37 +1,85 @@
+import time
 import logging
-from sqlalchemy.orm import Session
-from app.db.database import CacheLog, ResultLog
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import CacheLog, DescriptionCacheLog, insert_ignore, after_commit
+from app.setting.setting import (
+    CACHE_MEMORY_MAXSIZE,
+    CACHE_MEMORY_TTL,
+    DICTIONARY_REFRESH_INTERVAL,
+    FUZZY_CACHE_LOOKUP,
+    FUZZY_CACHE_THRESHOLD,
+)
+from app.util.ttl_cache import TTLCache
+from app.util.fish_name_matcher import FishNameMatcher
+from app.util.trigram_index import TrigramIndex, is_spelling_variant
+from app.util.text_utils import normalize_description, normalize_fish_name
 
 logger = logging.getLogger(__name__)
 
+# In-process tier shared by every CacheService instance, checked before cache_log.
+# Keyed by normalize_fish_name(extracted_fish_name). The app only ever inserts cache_log
+# rows; changes made outside the process, e.g. by make backfill-db, show up once entries
+# expire after CACHE_MEMORY_TTL.
+memory_cache = TTLCache(maxsize=CACHE_MEMORY_MAXSIZE, ttl=CACHE_MEMORY_TTL)
+description_memory_cache = TTLCache(maxsize=CACHE_MEMORY_MAXSIZE, ttl=CACHE_MEMORY_TTL)
+
+# Indexes over known cache_log names, extended incrementally from rows newer than indexes_last_id:
+# the dictionary matcher for extraction and the trigram index for fuzzy lookups without pg_trgm
+fish_name_matcher = FishNameMatcher()
+trigram_index = TrigramIndex()
+indexes_last_id = 0
+indexes_refreshed_at = 0.0
+# Most similar names considered on Postgres before the spelling variant check
+FUZZY_CANDIDATES = 5
+
+def to_cached_result(cache_log: CacheLog) -> tuple[str, str, str, int]:
+    return (
+        cache_log.fish_name_english,
+        cache_log.fish_name_latin,
+        cache_log.extracted_fish_name,
+        cache_log.id
+    )
+
 class CacheService:
     def __init__(self):
         logger.info("CacheService initialized successfully.")
 
-    def get_cached_result(self, db: Session, extracted_fish_name: str) -> tuple[bool, tuple[str, str, str] | None]:
+    async def get_cached_result(self, db: AsyncSession, extracted_fish_name: str) -> tuple[bool, tuple[str, str, str, int] | None]:
         """
         Check if the extracted fish name exists in cache and return the cached result if found.
+        Names are compared after normalize_fish_name, and if there is no exact match the most
+        similar cached name above FUZZY_CACHE_THRESHOLD is used.
         
         Args:
             db: Database session
             extracted_fish_name: The extracted fish name to look up
             
         Returns:
-            Tuple of (found_in_cache: bool, (fish_name_english: str, fish_name_latin: str, extracted_fish_name: str) | None)
+            Tuple of (found_in_cache: bool, (fish_name_english: str, fish_name_latin: str, extracted_fish_name: str, cache_log_id: int) | None)
         """
         logger.info(f"Checking cache for extracted fish name: '{extracted_fish_name}'")
+        normalized_fish_name = normalize_fish_name(extracted_fish_name)
+        if not normalized_fish_name:
+            return False, None
+
+        cached = memory_cache.get(normalized_fish_name)
+        if cached is not None:
+            logger.info(f"Memory cache hit for '{extracted_fish_name}'.")
+            return True, cached
+
         try:
-            cached_entry = db.query(CacheLog).filter(
-                CacheLog.extracted_fish_name == extracted_fish_name
-            ).first()
+            cached_entry = await db.scalar(
+                select(CacheLog).where(CacheLog.normalized_fish_name == normalized_fish_name).limit(1)
+            )
+            if not cached_entry and FUZZY_CACHE_LOOKUP:
+                cached_entry = await self.find_similar(db, normalized_fish_name)
             
             if cached_entry:
-                logger.info(f"Cache hit for '{extracted_fish_name}'.")
-                return True, (
-                    cached_entry.fish_name_english,
-                    cached_entry.fish_name_latin,
-                    cached_entry.extracted_fish_name
-                )
+                logger.info(f"Cache hit for '{extracted_fish_name}' ('{cached_entry.extracted_fish_name}').")
+                cached = to_cached_result(cached_entry)
+                memory_cache.set(normalized_fish_name, cached)
+                return True, cached
             
             logger.info(f"Cache miss for '{extracted_fish_name}'.")
             return False, None
@@ -39,38 +87,237 @@ class CacheService:
             logger.error(f"Error getting cached result for '{extracted_fish_name}': {str(e)}", exc_info=True)
             return False, None
 
-    def add_to_cache(self, db: Session, result_log: ResultLog) -> None:
+    async def get_cached_results(self, db: AsyncSession, extracted_fish_names: list[str]) -> dict[str, tuple[str, str, str, int]]:
         """
-        Add a new entry to the cache if the result log has flag=True.
+        Look up several extracted fish names in the cache with a single query for exact matches.
+        Names without an exact match fall back to a fuzzy lookup each.
         
         Args:
             db: Database session
-            result_log: The ResultLog entry to cache
+            extracted_fish_names: The extracted fish names to look up
+            
+        Returns:
+            Dictionary of extracted_fish_name -> (fish_name_english, fish_name_latin, extracted_fish_name, cache_log_id) for every hit
         """
-        if not result_log.flag:
-            return
-        
-        logger.info(f"Attempting to add result to cache for extracted fish name: '{result_log.extracted_fish_name}'")
+        logger.info(f"Checking cache for {len(extracted_fish_names)} extracted fish names.")
+        normalized = {name: normalize_fish_name(name) for name in extracted_fish_names}
+        results = {}
+        for name, normalized_fish_name in normalized.items():
+            cached = memory_cache.get(normalized_fish_name) if normalized_fish_name else None
+            if cached is not None:
+                results[name] = cached
+
+        remaining = [name for name in normalized if name not in results and normalized[name]]
+        if not remaining:
+            return results
         try:
-            existing = db.query(CacheLog).filter(
-                CacheLog.extracted_fish_name == result_log.extracted_fish_name
-            ).first()
+            cached_entries = (await db.scalars(
+                select(CacheLog).where(CacheLog.normalized_fish_name.in_({normalized[name] for name in remaining}))
+            )).all()
+            by_normalized = {entry.normalized_fish_name: to_cached_result(entry) for entry in cached_entries}
+
+            for name in remaining:
+                cached = by_normalized.get(normalized[name])
+                if cached is None and FUZZY_CACHE_LOOKUP:
+                    cached_entry = await self.find_similar(db, normalized[name])
+                    cached = to_cached_result(cached_entry) if cached_entry else None
+                if cached is not None:
+                    memory_cache.set(normalized[name], cached)
+                    results[name] = cached
+            logger.info(f"Cache hits: {len(results)}, misses: {len(normalized) - len(results)}.")
+            return results
+        except Exception as e:
+            logger.error(f"Error getting cached results: {str(e)}", exc_info=True)
+            return results
+
+    async def find_similar(self, db: AsyncSession, normalized_fish_name: str) -> CacheLog | None:
+        """
+        Find the cached entry whose normalized name is most similar to the given one.
+        Uses pg_trgm on Postgres and the in-memory trigram index on other databases.
+        Only spelling variants of the same words match (see is_spelling_variant), so a
+        similar name of a different species is a miss rather than a wrong cache hit.
+        
+        Args:
+            db: Database session
+            normalized_fish_name: The normalized fish name to look up
+            
+        Returns:
+            The most similar CacheLog entry with similarity >= FUZZY_CACHE_THRESHOLD, or None
+        """
+        def accept(name: str) -> bool:
+            return is_spelling_variant(normalized_fish_name, name, FUZZY_CACHE_THRESHOLD)
+
+        if db.bind.dialect.name == "postgresql":
+            similarity = func.similarity(CacheLog.normalized_fish_name, normalized_fish_name)
+            # The % operator lets the GIN trigram index pre-filter candidates
+            candidates = await db.scalars(
+                select(CacheLog)
+                .where(CacheLog.normalized_fish_name.op("%")(normalized_fish_name))
+                .where(similarity >= FUZZY_CACHE_THRESHOLD)
+                .order_by(similarity.desc())
+                .limit(FUZZY_CANDIDATES)
+            )
+            return next((candidate for candidate in candidates if accept(candidate.normalized_fish_name)), None)
+
+        await self.refresh_indexes(db)
+        match = trigram_index.best_match(normalized_fish_name, FUZZY_CACHE_THRESHOLD, accept)
+        if not match:
+            return None
+        similar_name, similarity = match
+        logger.info(f"Fuzzy match '{similar_name}' for '{normalized_fish_name}' (similarity {similarity:.2f}).")
+        return await db.scalar(
+            select(CacheLog).where(CacheLog.normalized_fish_name == similar_name).limit(1)
+        )
+
+    async def add_to_cache(
+        self,
+        db: AsyncSession,
+        result_log_id: int,
+        extracted_fish_name: str,
+        fish_name_english: str,
+        fish_name_latin: str
+    ) -> bool:
+        """
+        Stage a new cache entry for an agreed result in the caller's transaction.
+        Entries whose normalized or extracted name is already cached are skipped by the
+        database (unique cache_log.normalized_fish_name and extracted_fish_name). The in-memory
+        tiers are only updated once the caller commits.
+        
+        Args:
+            db: Database session, committed by the caller
+            result_log_id: Id of the ResultLog the entry was produced by
+            extracted_fish_name: The extracted fish name
+            fish_name_english: The agreed English common name
+            fish_name_latin: The agreed Latin name
+            
+        Returns:
+            True if a new cache_log row was inserted
+        """
+        logger.info(f"Adding result to cache for extracted fish name: '{extracted_fish_name}'")
+        normalized_fish_name = normalize_fish_name(extracted_fish_name)
+        if not normalized_fish_name:
+            return False
+
+        cache_log_id = await db.scalar(insert_ignore(db.bind.dialect.name, CacheLog).values(
+            id=result_log_id,
+            extracted_fish_name=extracted_fish_name,
+            normalized_fish_name=normalized_fish_name,
+            fish_name_english=fish_name_english,
+            fish_name_latin=fish_name_latin,
+            result_log_id=result_log_id
+        ).returning(CacheLog.id))
+        if cache_log_id is None:
+            logger.info(f"Cache entry for '{extracted_fish_name}' already exists. Skipping.")
+            return False
+
+        def remember():
+            fish_name_matcher.add(extracted_fish_name)
+            trigram_index.add(normalized_fish_name)
+            memory_cache.set(normalized_fish_name, (fish_name_english, fish_name_latin, extracted_fish_name, cache_log_id))
+        after_commit(db, remember)
+        return True
+
+    async def get_cached_extraction(self, db: AsyncSession, original_description: str) -> tuple[bool, str | None]:
+        """
+        Check if a product description has already been extracted and return the extracted fish name if found.
+        Descriptions are compared after normalize_description, so repeats that only differ
+        in case, whitespace or quantities/units share one entry.
+        
+        Args:
+            db: Database session
+            original_description: The original product description
             
-            if existing:
-                logger.info(f"Cache entry for '{result_log.extracted_fish_name}' already exists. Skipping.")
-                return
-                
-            cache_entry = CacheLog(
-                id=result_log.id,
-                extracted_fish_name=result_log.extracted_fish_name,
-                fish_name_english=result_log.fish_name_english,
-                fish_name_latin=result_log.fish_name_latin,
-                result_log_id=result_log.id
+        Returns:
+            Tuple of (found_in_cache: bool, extracted_fish_name: str | None)
+        """
+        normalized_description = normalize_description(original_description)
+        if not normalized_description:
+            return False, None
+
+        cached = description_memory_cache.get(normalized_description)
+        if cached is not None:
+            logger.info(f"Memory description cache hit for '{normalized_description}'.")
+            return True, cached
+
+        try:
+            cached_entry = await db.scalar(
+                select(DescriptionCacheLog).where(DescriptionCacheLog.normalized_description == normalized_description)
             )
+            if cached_entry:
+                logger.info(f"Description cache hit for '{normalized_description}'.")
+                description_memory_cache.set(normalized_description, cached_entry.extracted_fish_name)
+                return True, cached_entry.extracted_fish_name
+
+            logger.info(f"Description cache miss for '{normalized_description}'.")
+            return False, None
+        except Exception as e:
+            logger.error(f"Error getting cached extraction for '{normalized_description}': {str(e)}", exc_info=True)
+            return False, None
+
+    async def add_extraction_to_cache(self, db: AsyncSession, original_description: str, extracted_fish_name: str) -> None:
+        """
+        Stage a description -> extracted fish name entry in the caller's transaction.
+        Descriptions that are already cached are skipped by the database.
+        
+        Args:
+            db: Database session, committed by the caller
+            original_description: The original product description
+            extracted_fish_name: The fish name extracted from it
+        """
+        normalized_description = normalize_description(original_description)
+        if not normalized_description or not extracted_fish_name:
+            return
+
+        await db.execute(insert_ignore(db.bind.dialect.name, DescriptionCacheLog).values(
+            normalized_description=normalized_description,
+            extracted_fish_name=extracted_fish_name
+        ))
+        after_commit(db, lambda: description_memory_cache.set(normalized_description, extracted_fish_name))
+
+    async def match_fish_name(self, db: AsyncSession, original_description: str) -> str | None:
+        """
+        Extract the fish name from a description using the dictionary of known cache_log names.
+        
+        Args:
+            db: Database session, used to pick up cache entries added by other workers
+            original_description: The original product description
             
-            db.add(cache_entry)
-            db.commit()
-            logger.info(f"Successfully added cache entry for '{result_log.extracted_fish_name}'.")
+        Returns:
+            The matched extracted fish name, or None if there is no unambiguous match
+        """
+        await self.refresh_indexes(db)
+        fish_name = fish_name_matcher.match(original_description)
+        if fish_name:
+            logger.info(f"Dictionary match '{fish_name}' for '{original_description}'.")
+        return fish_name
+
+    async def refresh_indexes(self, db: AsyncSession, force: bool = False) -> None:
+        """Add cache_log names created since the last refresh to the dictionary matcher and trigram index."""
+        global indexes_last_id, indexes_refreshed_at
+        if not force and time.monotonic() - indexes_refreshed_at < DICTIONARY_REFRESH_INTERVAL:
+            return
+
+        indexes_refreshed_at = time.monotonic()
+        try:
+            rows = (await db.execute(
+                select(CacheLog.id, CacheLog.extracted_fish_name, CacheLog.normalized_fish_name)
+                .where(CacheLog.id > indexes_last_id)
+                .order_by(CacheLog.id)
+            )).all()
+            for cache_log_id, extracted_fish_name, normalized_fish_name in rows:
+                fish_name_matcher.add(extracted_fish_name)
+                trigram_index.add(normalized_fish_name)
+                indexes_last_id = max(indexes_last_id, cache_log_id)
+            if rows:
+                logger.info(f"Added {len(rows)} names to the dictionary matcher and trigram index.")
         except Exception as e:
-            logger.error(f"Error adding to cache for '{result_log.extracted_fish_name}': {str(e)}", exc_info=True)
-            db.rollback() 
\ No newline at end of file
+            logger.error(f"Error refreshing cache name indexes: {str(e)}", exc_info=True)
+
+    def get_memory_cache_stats(self) -> dict:
+        """Return size and hit/miss counters of the in-memory tiers."""
+        return {
+            "fish_name": memory_cache.stats(),
+            "description": description_memory_cache.stats(),
+            "dictionary_size": fish_name_matcher.size,
+            "trigram_index_size": len(trigram_index)
+        } 
\ No newline at end of file
@@ -0,0 +1,212 @@
+import os
+import csv
+import json
+import time
+import logging
+from typing import Callable, Iterator
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import AsyncSessionLocal, ImportCheckpoint
+from app.schema.result_log import ResultLogRequest, ResultLogResponse, ResultLogError
+from app.service.processing_service import ProcessingService
+from app.setting.setting import IMPORT_BATCH_SIZE, IMPORT_REJECTS_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+def iter_records(path: str, start_offset: int = 0) -> Iterator[tuple[dict | None, int]]:
+    """
+    Stream the records of a JSONL or CSV file starting at a byte offset.
+    Yields (record, offset after the record); records that cannot be parsed are yielded as None.
+    """
+    is_csv = path.lower().endswith(".csv")
+    with open(path, "rb") as f:
+        fieldnames = None
+        if is_csv:
+            fieldnames = next(csv.reader([f.readline().decode("utf-8-sig")]), None)
+            start_offset = max(start_offset, f.tell())
+        f.seek(start_offset)
+        position = start_offset
+
+        def lines() -> Iterator[str]:
+            nonlocal position
+            for raw in f:
+                position += len(raw)
+                yield raw.decode("utf-8")
+
+        if is_csv:
+            for row in csv.DictReader(lines(), fieldnames=fieldnames):
+                yield row, position
+        else:
+            for line in lines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                yield record if isinstance(record, dict) else None, position
+
+class ImportService:
+    """
+    Resumable bulk import of result log requests from JSONL or CSV files.
+    Records are processed in batches through ProcessingService.process_result_log_batch;
+    the file offset is checkpointed in import_checkpoint in the same transaction as each
+    batch, so a restarted import continues after the last stored batch. A batch that fails
+    as a whole is retried record by record. Failed records are written to a rejects file
+    before the checkpoint moves past them, and a batch without any stored record stops the import.
+    """
+    def __init__(self, processing_service: ProcessingService | None = None):
+        self.processing_service = processing_service or ProcessingService()
+        logger.info("ImportService initialized successfully.")
+
+    async def get_checkpoint(self, source: str) -> ImportCheckpoint | None:
+        async with AsyncSessionLocal() as db:
+            return await db.get(ImportCheckpoint, source)
+
+    async def import_file(
+        self,
+        path: str,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        restart: bool = False,
+        on_progress: Callable[[dict], None] | None = None,
+        rejects_path: str | None = None,
+        keep_going: bool = False
+    ) -> dict:
+        """
+        Import a JSONL or CSV file of result log requests.
+
+        A batch in which no record can be stored, e.g. during an LLM outage or while a circuit
+        breaker is open, stops the import before the checkpoint moves past it, so rerunning
+        the import retries it. Records that fail in a batch where others are stored are appended
+        with their offset and error to the rejects file, which can be imported again.
+
+        Args:
+            path: File with original_description, no_peb and no_seri per record
+            batch_size: Records written per transaction and checkpoint
+            restart: Ignore an existing checkpoint and import from the beginning
+            on_progress: Called with the running stats after every batch
+            rejects_path: JSONL file for rejected records, default path + ".rejects.jsonl"
+            keep_going: Reject the records of a batch that failed entirely instead of stopping
+
+        Returns:
+            Stats: records, skipped, failed (rejected), cache_hits, hit_rate, elapsed and records_per_second
+        """
+        source = os.path.abspath(path)
+        rejects_path = rejects_path or f"{source}{IMPORT_REJECTS_SUFFIX}"
+        checkpoint = None if restart else await self.get_checkpoint(source)
+        start_offset = checkpoint.byte_offset if checkpoint else 0
+        imported_before = checkpoint.records if checkpoint else 0
+        if checkpoint:
+            logger.info(f"Resuming import of {source} after {imported_before} records.")
+
+        stats = {"records": 0, "skipped": 0, "failed": 0, "cache_hits": 0, "hit_rate": 0.0, "elapsed": 0.0, "records_per_second": 0.0}
+        started = time.perf_counter()
+
+        async def save_checkpoint(db: AsyncSession, offset: int, records: int) -> None:
+            await db.merge(ImportCheckpoint(
+                source=source,
+                byte_offset=offset,
+                records=imported_before + stats["records"] + records
+            ))
+
+        def write_rejects(rejects: list[tuple[ResultLogError, int]]) -> None:
+            """Append rejected records to the rejects file; called before the checkpoint moves past them."""
+            if not rejects:
+                return
+            with open(rejects_path, "a", encoding="utf-8") as f:
+                for result_log, offset in rejects:
+                    logger.warning(f"Rejecting record {result_log.no_peb}/{result_log.no_seri} of {source}: {result_log.error}")
+                    f.write(json.dumps({**result_log.model_dump(), "source": source, "offset": offset}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        def count(result_logs: list[ResultLogResponse | ResultLogError]) -> None:
+            stats["records"] += len(result_logs)
+            stats["failed"] += sum(1 for result_log in result_logs if isinstance(result_log, ResultLogError))
+            stats["cache_hits"] += sum(1 for result_log in result_logs if isinstance(result_log, ResultLogResponse) and result_log.from_cache)
+
+        async def save_one_by_one(batch: list[tuple[ResultLogRequest, int]]) -> list[ResultLogResponse | ResultLogError]:
+            """Save the records of a failed batch one at a time, checkpointing after each stored record."""
+            result_logs: list[ResultLogResponse | ResultLogError] = []
+            unwritten: list[tuple[ResultLogError, int]] = []
+            for request, offset in batch:
+                async def checkpoint(db: AsyncSession, saved: list[ResultLogResponse | ResultLogError], offset: int = offset) -> None:
+                    if isinstance(saved[0], ResultLogResponse):
+                        write_rejects(unwritten)
+                        await save_checkpoint(db, offset, len(result_logs) + 1)
+
+                try:
+                    result_log = (await self.processing_service.process_result_log_batch([request], on_saved=checkpoint))[0]
+                except Exception as e:
+                    result_log = ResultLogError(**request.model_dump(), error=str(e))
+                if isinstance(result_log, ResultLogError):
+                    unwritten.append((result_log, offset))
+                else:
+                    unwritten = []
+                result_logs.append(result_log)
+
+            if unwritten and (keep_going or len(unwritten) < len(batch)):
+                write_rejects(unwritten)
+                async with AsyncSessionLocal() as db:
+                    await save_checkpoint(db, batch[-1][1], len(batch))
+                    await db.commit()
+            return result_logs
+
+        async def save_batch(batch: list[tuple[ResultLogRequest, int]]) -> None:
+            offsets = [offset for _, offset in batch]
+
+            def rejects_of(result_logs: list[ResultLogResponse | ResultLogError]) -> list[tuple[ResultLogError, int]]:
+                return [
+                    (result_log, offset) for result_log, offset in zip(result_logs, offsets)
+                    if isinstance(result_log, ResultLogError)
+                ]
+
+            async def checkpoint(db: AsyncSession, result_logs: list[ResultLogResponse | ResultLogError]) -> None:
+                rejects = rejects_of(result_logs)
+                if keep_going or len(rejects) < len(result_logs):
+                    write_rejects(rejects)
+                    await save_checkpoint(db, offsets[-1], len(result_logs))
+
+            try:
+                result_logs = await self.processing_service.process_result_log_batch(
+                    [request for request, _ in batch], on_saved=checkpoint
+                )
+            except Exception as e:
+                # One bad record must not stop the import, so the batch is retried record by record
+                logger.warning(f"Batch of {len(batch)} records of {source} failed, saving them one by one: {str(e)}")
+                result_logs = await save_one_by_one(batch)
+
+            if not keep_going and all(isinstance(result_log, ResultLogError) for result_log in result_logs):
+                # Nothing could be stored, which points at an outage rather than bad records
+                raise Exception(
+                    f"all {len(batch)} records of the batch starting with {result_logs[0].no_peb}/{result_logs[0].no_seri} "
+                    f"failed, first error: {result_logs[0].error}"
+                )
+            count(result_logs)
+            stats["elapsed"] = time.perf_counter() - started
+            stats["hit_rate"] = stats["cache_hits"] / stats["records"]
+            stats["records_per_second"] = stats["records"] / stats["elapsed"]
+            if on_progress is not None:
+                on_progress(stats)
+
+        try:
+            batch: list[tuple[ResultLogRequest, int]] = []
+            for record, offset in iter_records(source, start_offset):
+                try:
+                    # Numeric PEB and serial numbers in source files are accepted as text
+                    if isinstance(record, dict):
+                        record = {key: str(value) for key, value in record.items() if value is not None}
+                    batch.append((ResultLogRequest.model_validate(record), offset))
+                except ValidationError:
+                    stats["skipped"] += 1
+                    logger.warning(f"Skipping invalid record before offset {offset} of {source}.")
+                    continue
+                if len(batch) >= batch_size:
+                    await save_batch(batch)
+                    batch = []
+            if batch:
+                await save_batch(batch)
+            return stats
+        except Exception as e:
+            raise Exception(f"Error in import_file: {str(e)}")
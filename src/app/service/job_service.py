@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from datetime import timedelta
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import AsyncSessionLocal, Job, get_jakarta_time
+from app.schema.result_log import ResultLogRequest, ResultLogResponse
+from app.service.processing_service import ProcessingService
+from app.setting.setting import JOB_POLL_INTERVAL, JOB_LEASE_TIMEOUT, JOB_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+class JobService:
+    """
+    Durable queue of result log identifications stored in the job table.
+    Submitting returns immediately; a bounded pool of workers claims pending jobs
+    and runs them through ProcessingService.process_result_log.
+    """
+    def __init__(self, processing_service: ProcessingService):
+        self.processing_service = processing_service
+        self.workers: list[asyncio.Task] = []
+        self.wakeup = asyncio.Event()
+        logger.info("JobService initialized successfully.")
+
+    async def submit(self, db: AsyncSession, request: ResultLogRequest) -> Job:
+        """
+        Queue a result log request and return the pending job.
+        """
+        try:
+            job = Job(
+                status="pending",
+                original_description=request.original_description,
+                no_peb=request.no_peb,
+                no_seri=request.no_seri
+            )
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+            self.wakeup.set()
+            logger.info(f"Queued job {job.id}.")
+            return job
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"Error in submit: {str(e)}")
+
+    async def get_job(self, db: AsyncSession, job_id: int) -> Job | None:
+        return await db.get(Job, job_id)
+
+    async def claim_next(self, db: AsyncSession) -> Job | None:
+        """
+        Atomically mark the oldest pending job as running and return it.
+        Running jobs whose lease expired (their worker died) are claimed again.
+        On Postgres concurrent workers skip rows locked by each other.
+        """
+        now = get_jakarta_time()
+        candidate = (
+            select(Job.id)
+            .where(or_(
+                Job.status == "pending",
+                and_(Job.status == "running", Job.started_at < now - timedelta(seconds=JOB_LEASE_TIMEOUT))
+            ))
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        job = await db.scalar(
+            update(Job)
+            .where(Job.id == candidate)
+            .values(status="running", started_at=now, attempts=Job.attempts + 1)
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return job
+
+    def is_current_claim(self, job: Job):
+        """
+        Condition matching the job only while it is still running under this claim.
+        A job whose lease expired and was claimed again has a higher attempt count.
+        """
+        return and_(Job.id == job.id, Job.status == "running", Job.attempts == job.attempts)
+
+    async def finish(self, job: Job, error: str | None = None, retry: bool = False) -> None:
+        """Mark a running job failed, or hand it back to the queue when retry is set."""
+        async with AsyncSessionLocal() as db:
+            values = {"status": "pending", "error": error} if retry else {
+                "status": "failed",
+                "error": error,
+                "finished_at": get_jakarta_time()
+            }
+            await db.execute(
+                update(Job)
+                .where(self.is_current_claim(job))
+                .values(**values)
+            )
+            await db.commit()
+
+    async def requeue(self, job: Job) -> None:
+        """Hand a job interrupted by shutdown back to the queue without counting the attempt."""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(self.is_current_claim(job))
+                .values(status="pending", attempts=Job.attempts - 1)
+            )
+            await db.commit()
+
+    async def run_job(self, job: Job) -> None:
+        """
+        Run one claimed job. The job is marked done in the same transaction
+        that writes its result log, and only while this worker still holds the claim,
+        so a result is never stored twice.
+        """
+        if job.attempts > JOB_MAX_ATTEMPTS:
+            logger.error(f"Job {job.id} exceeded {JOB_MAX_ATTEMPTS} attempts.")
+            await self.finish(job, job.error or "Exceeded maximum attempts")
+            return
+
+        async def complete(db: AsyncSession, result_log: ResultLogResponse) -> None:
+            result = await db.execute(
+                update(Job)
+                .where(self.is_current_claim(job))
+                .values(status="done", result_log_id=result_log.id, error=None, finished_at=get_jakarta_time())
+            )
+            if result.rowcount == 0:
+                # Raising rolls back the result log written in the same transaction
+                raise Exception(f"job {job.id} lease expired and the job was claimed again")
+
+        try:
+            await self.processing_service.process_result_log(
+                job.original_description, job.no_peb, job.no_seri, on_saved=complete
+            )
+            logger.info(f"Job {job.id} done.")
+        except asyncio.CancelledError:
+            # Shutting down, the next start picks the job up again
+            await self.requeue(job)
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} attempt {job.attempts} failed: {str(e)}")
+            await self.finish(job, str(e), retry=job.attempts < JOB_MAX_ATTEMPTS)
+
+    async def claim(self) -> Job | None:
+        """
+        Claim the next job in its own session. A shutdown arriving mid-claim lets the claim
+        finish and hands the job back, so it is not left running until its lease expires.
+        """
+        async def claim_in_session() -> Job | None:
+            async with AsyncSessionLocal() as db:
+                return await self.claim_next(db)
+
+        claiming = asyncio.ensure_future(claim_in_session())
+        try:
+            return await asyncio.shield(claiming)
+        except asyncio.CancelledError:
+            job = await claiming
+            if job is not None:
+                await self.requeue(job)
+            raise
+
+    async def work(self, worker_id: int) -> None:
+        """Worker loop: claim and run jobs, waiting for a submit or JOB_POLL_INTERVAL when idle."""
+        logger.info(f"Job worker {worker_id} started.")
+        while True:
+            try:
+                self.wakeup.clear()
+                job = await self.claim()
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                # e.g. the database was unreachable when recording the outcome; the lease expires and the job is retried
+                logger.error(f"Job worker {worker_id} failed to run job {job.id}: {str(e)}")
+
+    def start_workers(self, count: int) -> None:
+        # Created here so the event belongs to the running loop
+        self.wakeup = asyncio.Event()
+        self.workers = [asyncio.create_task(self.work(worker_id)) for worker_id in range(count)]
+
+    async def stop_workers(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
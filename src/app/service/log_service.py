@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Type
+from pydantic import BaseModel
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.setting.setting import STREAM_YIELD_PER
+from app.db.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+class LogService:
+    """
+    Listing of log tables with keyset pagination on id and NDJSON streaming.
+    Neither path loads a whole table, so memory stays flat as the tables grow.
+    """
+    def __init__(self):
+        logger.info("LogService initialized successfully.")
+
+    def build_query(
+        self,
+        model,
+        filters: dict,
+        after_id: int | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None
+    ) -> Select:
+        """
+        Build the ordered listing query for a log table.
+
+        Args:
+            model: ORM model to list
+            filters: Column name to value; None values are ignored
+            after_id: Only return rows with an id greater than this cursor
+            created_from: Only return rows created at or after this time
+            created_to: Only return rows created before this time
+
+        Returns:
+            Select ordered by id
+        """
+        query = select(model)
+        for column, value in filters.items():
+            if value is not None:
+                query = query.where(getattr(model, column) == value)
+        if created_from is not None:
+            query = query.where(model.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(model.created_at < created_to)
+        if after_id is not None:
+            query = query.where(model.id > after_id)
+        return query.order_by(model.id)
+
+    async def get_page(self, db: AsyncSession, query: Select, limit: int) -> tuple[list, int | None]:
+        """
+        Get one page of rows of a listing query.
+
+        Returns:
+            Tuple of (rows, next cursor or None if this is the last page)
+        """
+        try:
+            # Fetch one extra row to know whether another page exists
+            rows = (await db.scalars(query.limit(limit + 1))).all()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                return rows, rows[-1].id
+            return rows, None
+        except Exception as e:
+            raise Exception(f"Error in get_page: {str(e)}")
+
+    async def stream_ndjson(self, query: Select, schema: Type[BaseModel]) -> AsyncIterator[str]:
+        """
+        Yield the rows of a listing query as newline-delimited JSON from a server-side cursor.
+        Uses its own session because the response body is sent after the request scope ends.
+        """
+        query = query.execution_options(yield_per=STREAM_YIELD_PER)
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(query)
+            async for partition in result.partitions():
+                yield "".join(
+                    schema.model_validate(row, from_attributes=True).model_dump_json() + "\n"
+                    for row in partition
+                )
+                # Rows of a finished partition are no longer needed
+                db.expunge_all()
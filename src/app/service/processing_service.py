@@ -1,13 +1,45 @@
-import json
+import asyncio
+import logging
+from typing import Awaitable, Callable, Hashable, Iterable
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.fish_identification_service import FishIdentificationService
 from app.core.text_extraction_service import TextExtractionService
 from app.core.file_service import FileService
-from app.schema.result_log import ResultLogResponse
-from app.db.database import SessionLocal, ProcessingLog, ResultLog
+from app.schema.processing_log import AgentResult
+from app.schema.result_log import ResultLogRequest, ResultLogResponse, ResultLogError
+from app.schema.usage import LLMUsage
+from app.setting.setting import BATCH_CONCURRENCY, DICTIONARY_EXTRACTION, PIPELINE_MODE
+from app.util.text_utils import normalize_description, normalize_fish_name
+from app.util.single_flight import SingleFlight
+from app.util.metrics import stage_duration, cache_lookups, agent_agreements
+from app.db.database import AsyncSessionLocal, ProcessingLog, AgentResultLog, ResultLog, count_statements
 from app.service.cache_service import CacheService
 from app.service.audit_service import AuditService
 
+logger = logging.getLogger(__name__)
+
+# Concurrent misses for the same normalized fish name share one agent consensus
+identification_flight = SingleFlight()
+llm_calls_saved = 0
+
+async def gather_settled(keys: Iterable[Hashable], calls: Iterable[Awaitable]) -> tuple[dict, dict]:
+    """
+    Run calls concurrently like asyncio.gather, without one failure discarding the other results.
+    Returns:
+        Tuple of (results, errors), both keyed by the key of each call
+    """
+    results, errors = {}, {}
+    for key, outcome in zip(list(keys), await asyncio.gather(*calls, return_exceptions=True)):
+        if isinstance(outcome, Exception):
+            errors[key] = outcome
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[key] = outcome
+    return results, errors
+
 class ProcessingService:
     def __init__(self):
         self.fish_service = FishIdentificationService()
@@ -16,9 +48,258 @@ class ProcessingService:
         self.cache_service = CacheService()
         self.audit_service = AuditService()
 
-    def process_log(self, extracted_fish_name: str, no_peb: str, no_seri: str):
+    async def extract_fish_name(self, original_description: str, call_model: bool = True) -> tuple[str | None, LLMUsage | None]:
+        """
+        Extract the fish name from a product description, answering repeated
+        descriptions from the description cache and descriptions that contain a
+        single known fish name from the dictionary matcher instead of calling the model.
+        Args:
+            original_description: The original product description
+            call_model: Whether to call the extraction model on a miss; if not, misses return (None, None)
+        Returns:
+            Tuple of (extracted_fish_name, extraction_usage); extraction_usage is None unless the
+            model was called, and extractions made by the model should be added to the
+            description cache when the result is saved
+        """
+        with stage_duration.time(stage="db_read"):
+            async with AsyncSessionLocal() as db:
+                found_in_cache, extracted_fish_name = await self.cache_service.get_cached_extraction(db, original_description)
+                if not found_in_cache and DICTIONARY_EXTRACTION:
+                    extracted_fish_name = await self.cache_service.match_fish_name(db, original_description)
+                    found_in_cache = extracted_fish_name is not None
+        cache_lookups.inc(cache="extraction", result="hit" if found_in_cache else "miss")
+        if found_in_cache:
+            return extracted_fish_name, None
+        if not call_model:
+            return None, None
+
+        with stage_duration.time(stage="extraction"):
+            return await self.text_service.extract_text_with_usage(original_description)
+
+    async def identify(self, extracted_fish_name: str) -> tuple[bool, str, str, list[AgentResult | None]]:
+        """
+        Run the agents on an extracted fish name and check their agreement.
+        Args:
+            extracted_fish_name: The extracted fish name to identify
+        Returns:
+            Tuple of (flag, fish_name_english, fish_name_latin, agent_results)
+        """
+        cancelled_calls: list[str] = []
+        try:
+            with stage_duration.time(stage="consensus"):
+                agent_results = await self.fish_service.run_agents(extracted_fish_name, cancelled_calls=cancelled_calls)
+        finally:
+            await self.save_cancelled_calls(cancelled_calls)
+        with stage_duration.time(stage="consensus"):
+            flag, fish_name_english, fish_name_latin, _ = self.fish_service.check_agent_agreement(agent_results)
+        agent_agreements.inc(result="agreed" if flag else "disagreed")
+        return flag, fish_name_english, fish_name_latin, agent_results
+
+    async def identify_once(self, extracted_fish_name: str) -> tuple[tuple[bool, str, str, list[AgentResult | None]], bool]:
+        """
+        Identify an extracted fish name, joining the identification already running
+        for the same normalized name instead of starting another agent consensus.
+        Args:
+            extracted_fish_name: The extracted fish name to identify
+        Returns:
+            Tuple of (identify result, shared); shared results were produced and
+            stored by another request, so callers should not record their agent results again
+        """
+        global llm_calls_saved
+        key = normalize_fish_name(extracted_fish_name) or extracted_fish_name
+        identification, shared = await identification_flight.do(key, lambda: self.identify(extracted_fish_name))
+        if shared:
+            # Agents that were cancelled or never called in escalate mode are None
+            calls = sum(1 for result in identification[3] if result is not None)
+            llm_calls_saved += calls
+            logger.info(f"Joined in-flight identification of '{key}', saved {calls} LLM calls.")
+        return identification, shared
+
+    async def identify_description(self, original_description: str) -> tuple[tuple[bool, str, str, list[AgentResult | None]], str]:
+        """
+        Run the agents in combined mode, extracting and identifying the fish name
+        of a product description in one call per agent, and check their agreement.
+        Args:
+            original_description: The original product description
+        Returns:
+            Tuple of (identify result, extracted_fish_name) with the name extracted by the majority agent
+        """
+        cancelled_calls: list[str] = []
+        try:
+            with stage_duration.time(stage="consensus"):
+                agent_results = await self.fish_service.run_agents(
+                    original_description, combined=True, cancelled_calls=cancelled_calls
+                )
+        finally:
+            await self.save_cancelled_calls(cancelled_calls)
+        with stage_duration.time(stage="consensus"):
+            flag, fish_name_english, fish_name_latin, extracted_fish_name = self.fish_service.check_agent_agreement(agent_results)
+        agent_agreements.inc(result="agreed" if flag else "disagreed")
+        return (flag, fish_name_english, fish_name_latin, agent_results), extracted_fish_name
+
+    async def identify_description_once(
+        self, original_description: str
+    ) -> tuple[tuple[bool, str, str, list[AgentResult | None]], str, bool]:
+        """
+        Identify a product description in combined mode, joining the identification
+        already running for the same normalized description.
+        Args:
+            original_description: The original product description
+        Returns:
+            Tuple of (identify result, extracted_fish_name, shared), as in identify_once
+        """
+        global llm_calls_saved
+        key = ("description", normalize_description(original_description) or original_description)
+        (identification, extracted_fish_name), shared = await identification_flight.do(
+            key, lambda: self.identify_description(original_description)
+        )
+        if shared:
+            # Agents that were cancelled or never called in escalate mode are None
+            calls = sum(1 for result in identification[3] if result is not None)
+            llm_calls_saved += calls
+            logger.info(f"Joined in-flight identification of description '{key[1]}', saved {calls} LLM calls.")
+        return identification, extracted_fish_name, shared
+
+    async def save_cancelled_calls(self, cancelled_calls: list[str]) -> None:
+        """
+        Store the agent calls cancelled in flight, which are billed without returning usage.
+        Failures are logged and do not fail the identification.
+        """
+        if not cancelled_calls:
+            return
+        try:
+            with stage_duration.time(stage="db_write"):
+                async with AsyncSessionLocal() as db:
+                    await self.audit_service.record_cancelled_agent_calls(db, cancelled_calls)
+                    await db.commit()
+        except Exception as e:
+            logger.error(f"Error saving {len(cancelled_calls)} cancelled agent calls: {str(e)}")
+
+    def get_single_flight_stats(self) -> dict:
+        """Get counters of identifications run, joined and LLM calls saved by coalescing."""
+        return {**identification_flight.stats(), "llm_calls_saved": llm_calls_saved}
+
+    async def save_processing_log(
+        self,
+        db: AsyncSession,
+        original_description: str,
+        no_peb: str,
+        no_seri: str,
+        agent_results: list[AgentResult | None] | None = None,
+        cache_log_id: int | None = None
+    ) -> int:
+        """
+        Stage a ProcessingLog row and one agent_result row per finished agent in the
+        caller's transaction and return the processing log id.
+        Cache hits are recorded with cache_log_id and no agent rows.
+        """
+        self.audit_service.track(db, "processing_log")
+        processing_log_id = await db.scalar(
+            insert(ProcessingLog).values(
+                original_description=original_description,
+                no_peb=no_peb,
+                no_seri=no_seri,
+                cache_log_id=cache_log_id
+            ).returning(ProcessingLog.id)
+        )
+
+        agent_rows = [
+            {
+                "processing_log_id": processing_log_id,
+                "agent_index": index,
+                "model": result.agent,
+                "fish_common_name": result.fish_common_name,
+                "latin_name": result.latin_name,
+                "reasoning": result.reasoning,
+                "latency_ms": result.latency_ms,
+                "prompt_tokens": result.prompt_tokens,
+                "completion_tokens": result.completion_tokens,
+                "cost": result.cost,
+            }
+            for index, result in enumerate(agent_results or [], start=1)
+            if result is not None
+        ]
+        if agent_rows:
+            await db.execute(insert(AgentResultLog), agent_rows)
+        return processing_log_id
+
+    async def save_result_log(
+        self,
+        db: AsyncSession,
+        original_description: str,
+        no_peb: str,
+        no_seri: str,
+        extracted_fish_name: str,
+        fish_name_english: str,
+        fish_name_latin: str,
+        flag: bool,
+        from_cache: bool,
+        agent_results: list[AgentResult | None] | None = None,
+        extraction_usage: LLMUsage | None = None,
+        extracted_by_agents: bool = False
+    ) -> ResultLogResponse:
+        """
+        Stage every row produced by one identification in the caller's transaction:
+        the description cache entry, the processing log, the result log and the cache entry.
+        Row counters are applied by the caller with AuditService.update_counters before committing.
+        Nothing is committed here, so the rows are written together or not at all.
+        Args:
+            db: Database session, committed by the caller
+            agent_results: Agent results of a fresh identification, None for cache hits
+            extraction_usage: Usage of the extraction model call, None if the name came from a cache
+            extracted_by_agents: Whether the name was extracted by the agents in combined mode;
+                it is added to the description cache only if they agreed
+        Returns:
+            A ResultLogResponse object for the staged result log
+        """
+        if extraction_usage is not None or (extracted_by_agents and flag):
+            await self.cache_service.add_extraction_to_cache(db, original_description, extracted_fish_name)
+
+        if agent_results is not None:
+            await self.save_processing_log(db, extracted_fish_name, no_peb, no_seri, agent_results)
+
+        result_log_id = await db.scalar(
+            insert(ResultLog).values(
+                original_description=original_description,
+                no_peb=no_peb,
+                no_seri=no_seri,
+                extracted_fish_name=extracted_fish_name,
+                fish_name_english=fish_name_english,
+                fish_name_latin=fish_name_latin,
+                flag=flag,
+                from_cache=from_cache,
+                extraction_model=extraction_usage.model if extraction_usage else None,
+                extraction_prompt_tokens=extraction_usage.prompt_tokens if extraction_usage else None,
+                extraction_completion_tokens=extraction_usage.completion_tokens if extraction_usage else None,
+                extraction_cost=extraction_usage.cost if extraction_usage else None
+            ).returning(ResultLog.id)
+        )
+
+        self.audit_service.track(db, "result_log")
+        if flag:
+            self.audit_service.track_fish(db, fish_name_english, fish_name_latin)
+
+        if flag and not from_cache:
+            if await self.cache_service.add_to_cache(
+                db, result_log_id, extracted_fish_name, fish_name_english, fish_name_latin
+            ):
+                self.audit_service.track(db, "cache_log")
+
+        return ResultLogResponse(
+            id=result_log_id,
+            no_peb=no_peb,
+            no_seri=no_seri,
+            original_description=original_description,
+            extracted_fish_name=extracted_fish_name,
+            fish_name_english=fish_name_english,
+            fish_name_latin=fish_name_latin,
+            flag=flag,
+            from_cache=from_cache
+        )
+
+    async def process_log(self, extracted_fish_name: str, no_peb: str, no_seri: str):
         """
-        Process the input through all three agents and return a structured log.
+        Process the input through the agents and return a structured log.
         Args:
             extracted_fish_name: The extracted fish name to process
             no_peb: The PEB number
@@ -27,42 +308,18 @@ class ProcessingService:
             A dictionary containing the processing log with all agent results
         """
         try:
-            db = SessionLocal()
-            try:
-                found_in_cache, cached_result = self.cache_service.get_cached_result(db, extracted_fish_name)
+            async with AsyncSessionLocal() as db:
+                found_in_cache, cached_result = await self.cache_service.get_cached_result(db, extracted_fish_name)
                 if found_in_cache:
-                    fish_name_english, fish_name_latin, cached_fish_name = cached_result
-                    db_log = ProcessingLog(
-                        original_description=extracted_fish_name,
-                        no_peb=no_peb,
-                        no_seri=no_seri,
-                        agent_1_result=json.dumps({
-                            "cached": True,
-                            "fish_common_name": fish_name_english,
-                            "latin_name": fish_name_latin,
-                            "extracted_fish_name": cached_fish_name
-                        }),
-                        agent_2_result=json.dumps({
-                            "cached": True,
-                            "fish_common_name": fish_name_english,
-                            "latin_name": fish_name_latin,
-                            "extracted_fish_name": cached_fish_name
-                        }),
-                        agent_3_result=json.dumps({
-                            "cached": True,
-                            "fish_common_name": fish_name_english,
-                            "latin_name": fish_name_latin,
-                            "extracted_fish_name": cached_fish_name
-                        })
+                    fish_name_english, fish_name_latin, cached_fish_name, cache_log_id = cached_result
+                    processing_log_id = await self.save_processing_log(
+                        db, extracted_fish_name, no_peb, no_seri, cache_log_id=cache_log_id
                     )
-                    db.add(db_log)
-                    db.commit()
-                    db.refresh(db_log)
-                    
-                    self.audit_service.get_latest_audit_log(db)
-                    
+                    await self.audit_service.update_counters(db)
+                    await db.commit()
+
                     return {
-                        "id": db_log.id,
+                        "id": processing_log_id,
                         "no_peb": no_peb,
                         "no_seri": no_seri,
                         "original_description": extracted_fish_name,
@@ -71,143 +328,282 @@ class ProcessingService:
                         "fish_name_latin": fish_name_latin,
                         "extracted_fish_name": cached_fish_name
                     }
-            finally:
-                db.close()
-
-            agent1_response = self.fish_service.agent1(extracted_fish_name)
-            agent2_response = self.fish_service.agent2(extracted_fish_name)
-            agent3_response = self.fish_service.agent3(extracted_fish_name)
-
-            agent1_result = self.fish_service.extract_agent_content(agent1_response)
-            agent2_result = self.fish_service.extract_agent_content(agent2_response)
-            agent3_result = self.fish_service.extract_agent_content(agent3_response)
-
-            db = SessionLocal()
-            try:
-                db_log = ProcessingLog(
-                    original_description=extracted_fish_name,
-                    no_peb=no_peb,
-                    no_seri=no_seri,
-                    agent_1_result=json.dumps(agent1_result.model_dump()),
-                    agent_2_result=json.dumps(agent2_result.model_dump()),
-                    agent_3_result=json.dumps(agent3_result.model_dump())
+
+            cancelled_calls: list[str] = []
+            agent_results = await self.fish_service.run_agents(extracted_fish_name, cancelled_calls=cancelled_calls)
+            # The first three agents keep their agent_N_result fields
+            agent1_result, agent2_result, agent3_result = (agent_results + [None] * 3)[:3]
+
+            async with AsyncSessionLocal() as db:
+                processing_log_id = await self.save_processing_log(
+                    db, extracted_fish_name, no_peb, no_seri, agent_results
                 )
-                db.add(db_log)
-                db.commit()
-                db.refresh(db_log)
-                
-                self.audit_service.get_latest_audit_log(db)
-                
+                await self.audit_service.record_cancelled_agent_calls(db, cancelled_calls)
+                await self.audit_service.update_counters(db)
+                await db.commit()
+
                 processing_log = {
-                    "id": db_log.id,
+                    "id": processing_log_id,
                     "no_peb": no_peb,
                     "no_seri": no_seri,
                     "original_description": extracted_fish_name,
                     "agent_1_result": agent1_result,
                     "agent_2_result": agent2_result,
-                    "agent_3_result": agent3_result
+                    "agent_3_result": agent3_result,
+                    "agent_results": agent_results
                 }
-    
+
                 return processing_log
-            finally:
-                db.close()
         except Exception as e:
             raise Exception(f"Error in processing log: {str(e)}")
 
-    def process_result_log(self, original_description: str, no_peb: str, no_seri: str):
+    async def process_result_log(
+        self,
+        original_description: str,
+        no_peb: str,
+        no_seri: str,
+        on_saved: Callable[[AsyncSession, ResultLogResponse], Awaitable[None]] | None = None
+    ):
         """
         Process the result log and check agent agreement.
+        All rows for the identification are written in a single transaction.
         Args:
             original_description: The original product description
             no_peb: The PEB number
             no_seri: The serial number
+            on_saved: Optional callback staging more writes in the same transaction, e.g. completing a job
         Returns:
             A ResultLogResponse object
         """
         try:
-            extracted_fish_name = self.text_service.extract_text(original_description)
-            
-            db = SessionLocal()
-            try:
-                found_in_cache, cached_result = self.cache_service.get_cached_result(db, extracted_fish_name)
-                if found_in_cache:
-                    fish_name_english, fish_name_latin, cached_fish_name = cached_result
-                    
-                    db_log = ResultLog(
-                        original_description=original_description,
-                        no_peb=no_peb,
-                        no_seri=no_seri,
-                        extracted_fish_name=extracted_fish_name,
-                        fish_name_english=fish_name_english,
-                        fish_name_latin=fish_name_latin,
-                        flag=True,
-                        from_cache=True
-                    )
-                    db.add(db_log)
-                    db.commit()
-                    db.refresh(db_log)
-                    
-                    self.audit_service.get_latest_audit_log(db)
-                    
-                    result_log = ResultLogResponse(
-                        id=db_log.id,
-                        no_peb=no_peb,
-                        no_seri=no_seri,
-                        original_description=original_description,
-                        extracted_fish_name=extracted_fish_name,
-                        fish_name_english=fish_name_english,
-                        fish_name_latin=fish_name_latin,
-                        flag=True,
-                        from_cache=True
-                    )
-                    
-                    return result_log
-            finally:
-                db.close()
-
-            processing_result = self.process_log(extracted_fish_name, no_peb, no_seri)
-            
-            flag, fish_name_english, fish_name_latin, _ = self.fish_service.check_agent_agreement([
-                processing_result["agent_1_result"],
-                processing_result["agent_2_result"],
-                processing_result["agent_3_result"]
-            ])
-
-            db = SessionLocal()
-            try:
-                db_log = ResultLog(
-                    original_description=original_description,
-                    no_peb=no_peb,
-                    no_seri=no_seri,
-                    extracted_fish_name=extracted_fish_name,
-                    fish_name_english=fish_name_english,
-                    fish_name_latin=fish_name_latin,
-                    flag=flag,
-                    from_cache=False
-                )
-                db.add(db_log)
-                db.commit()
-                db.refresh(db_log)
-                
-                if flag:
-                    self.cache_service.add_to_cache(db, db_log)
-                
-                self.audit_service.get_latest_audit_log(db)
-                
-                result_log = ResultLogResponse(
-                    id=db_log.id,
-                    no_peb=no_peb,
-                    no_seri=no_seri,
-                    original_description=original_description,
-                    extracted_fish_name=extracted_fish_name,
-                    fish_name_english=fish_name_english,
-                    fish_name_latin=fish_name_latin,
-                    flag=flag,
-                    from_cache=False
+            with count_statements() as round_trips:
+                extracted_fish_name, extraction_usage = await self.extract_fish_name(
+                    original_description, call_model=PIPELINE_MODE != "combined"
                 )
 
-                return result_log
-            finally:
-                db.close()
+                agent_results = None
+                extracted_by_agents = False
+                if extracted_fish_name is None:
+                    # Combined mode: the agents extract and identify the name in one call
+                    identification, extracted_fish_name, shared = await self.identify_description_once(original_description)
+                    flag, fish_name_english, fish_name_latin, agent_results = identification
+                    found_in_cache = flag and shared
+                    extracted_by_agents = not shared
+                    if shared:
+                        agent_results = None
+                    # A name that is already cached keeps its cached identification, as in the two step mode
+                    with stage_duration.time(stage="db_read"):
+                        async with AsyncSessionLocal() as db:
+                            name_in_cache, cached_result = await self.cache_service.get_cached_result(db, extracted_fish_name)
+                    cache_lookups.inc(cache="result", result="hit" if name_in_cache else "miss")
+                    if name_in_cache:
+                        fish_name_english, fish_name_latin, _, _ = cached_result
+                        flag, found_in_cache = True, shared
+                else:
+                    with stage_duration.time(stage="db_read"):
+                        async with AsyncSessionLocal() as db:
+                            found_in_cache, cached_result = await self.cache_service.get_cached_result(db, extracted_fish_name)
+                    cache_lookups.inc(cache="result", result="hit" if found_in_cache else "miss")
+
+                    if found_in_cache:
+                        fish_name_english, fish_name_latin, _, _ = cached_result
+                        flag = True
+                    else:
+                        identification, shared = await self.identify_once(extracted_fish_name)
+                        flag, fish_name_english, fish_name_latin, agent_results = identification
+                        if shared:
+                            # Stored by the request that ran the agents, served here like a cache hit
+                            found_in_cache = flag
+                            agent_results = None
+
+                with stage_duration.time(stage="db_write"):
+                    async with AsyncSessionLocal() as db:
+                        result_log = await self.save_result_log(
+                            db,
+                            original_description=original_description,
+                            no_peb=no_peb,
+                            no_seri=no_seri,
+                            extracted_fish_name=extracted_fish_name,
+                            fish_name_english=fish_name_english,
+                            fish_name_latin=fish_name_latin,
+                            flag=flag,
+                            from_cache=found_in_cache,
+                            agent_results=agent_results,
+                            extraction_usage=extraction_usage,
+                            extracted_by_agents=extracted_by_agents
+                        )
+                        if on_saved is not None:
+                            await on_saved(db, result_log)
+                        await self.audit_service.update_counters(db)
+                        await db.commit()
+
+            logger.info(
+                f"Result log {result_log.id} used {round_trips['statements']} database statements "
+                f"and {round_trips['commits']} commit(s)."
+            )
+            return result_log
+        except Exception as e:
+            raise Exception(f"Error in processing result log: {str(e)}")
+
+    async def process_result_log_batch(
+        self,
+        requests: list[ResultLogRequest],
+        on_saved: Callable[[AsyncSession, list[ResultLogResponse | ResultLogError]], Awaitable[None]] | None = None
+    ) -> list[ResultLogResponse | ResultLogError]:
+        """
+        Process a batch of result logs, e.g. all line items of one PEB declaration.
+        Descriptions that normalize to the same text are extracted once,
+        identical extracted names are identified once, cache hits are resolved
+        with a single query and misses run with at most BATCH_CONCURRENCY
+        concurrent LLM pipelines. All rows are written in a single transaction.
+        A failed extraction or identification only fails the line items that depend on it;
+        the other line items are still saved.
+        Args:
+            requests: The result log requests to process
+            on_saved: Optional callback staging more writes in the same transaction, e.g. an import checkpoint
+        Returns:
+            A ResultLogResponse, or a ResultLogError for failed line items, per request in the same order
+        """
+        try:
+            semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+            async def extract(description: str) -> tuple[str, LLMUsage | None]:
+                async with semaphore:
+                    return await self.extract_fish_name(description, call_model=PIPELINE_MODE != "combined")
+
+            def description_key(description: str) -> str:
+                return normalize_description(description) or description
+
+            # Descriptions that normalize to the same text are extracted once
+            descriptions = {}
+            for request in requests:
+                descriptions.setdefault(description_key(request.original_description), request.original_description)
+            extracted_by_key, failed_descriptions = await gather_settled(
+                descriptions, (extract(description) for description in descriptions.values())
+            )
+
+            def name_key(extracted_fish_name: str) -> str:
+                return normalize_fish_name(extracted_fish_name) or extracted_fish_name
+
+            # Combined mode: descriptions missed by the caches are extracted and identified in one agent call
+            async def identify_description(description: str) -> tuple[tuple[bool, str, str, list[AgentResult | None]], str, bool]:
+                async with semaphore:
+                    return await self.identify_description_once(description)
+
+            combined_keys = [key for key, (extracted_fish_name, _) in extracted_by_key.items() if extracted_fish_name is None]
+            combined_results = {}
+            combined = {}
+            identified_descriptions, failed_combined = await gather_settled(
+                combined_keys, (identify_description(descriptions[key]) for key in combined_keys)
+            )
+            failed_descriptions.update(failed_combined)
+            for key in failed_combined:
+                del extracted_by_key[key]
+            for key, (identification, extracted_fish_name, shared) in identified_descriptions.items():
+                extracted_by_key[key] = (extracted_fish_name, None)
+                combined_results[key] = (identification, shared)
+                # Other descriptions with the same name reuse it, its agent results are recorded with its description
+                combined.setdefault(name_key(extracted_fish_name), (identification, True))
+
+            # First request for each extracted name is the one its processing log is recorded against
+            first_requests = {}
+            representative_names = {}
+            for request in requests:
+                if description_key(request.original_description) in failed_descriptions:
+                    continue
+                extracted_fish_name, _ = extracted_by_key[description_key(request.original_description)]
+                key = name_key(extracted_fish_name)
+                if key not in first_requests:
+                    first_requests[key] = request
+                    representative_names[key] = extracted_fish_name
+
+            # Names identified in combined mode are looked up too, a cached identification wins as in the two step mode
+            with stage_duration.time(stage="db_read"):
+                async with AsyncSessionLocal() as db:
+                    cached_by_name = await self.cache_service.get_cached_results(db, list(representative_names.values()))
+            cached_results = {
+                key: cached_by_name[name] for key, name in representative_names.items() if name in cached_by_name
+            }
+            cache_lookups.inc(len(cached_results), cache="result", result="hit")
+            cache_lookups.inc(len(representative_names) - len(cached_results), cache="result", result="miss")
+            lookup_names = {key: name for key, name in representative_names.items() if key not in combined}
+
+            async def identify(key: str) -> tuple[tuple[bool, str, str, list[AgentResult | None]], bool]:
+                async with semaphore:
+                    return await self.identify_once(representative_names[key])
+
+            missed_keys = [key for key in lookup_names if key not in cached_results]
+            identified, failed_names = await gather_settled(missed_keys, (identify(key) for key in missed_keys))
+            identified.update(combined)
+
+            with stage_duration.time(stage="db_write"):
+                async with AsyncSessionLocal() as db:
+                    result_logs = []
+                    seen_descriptions = set()
+                    seen_keys = set()
+                    for request in requests:
+                        request_description = description_key(request.original_description)
+                        error = failed_descriptions.get(request_description)
+                        if error is None:
+                            extracted_fish_name, extraction_usage = extracted_by_key[request_description]
+                            key = name_key(extracted_fish_name)
+                            error = failed_names.get(key)
+                        if error is not None:
+                            logger.error(f"Failed to process line item {request.no_peb}/{request.no_seri}: {str(error)}")
+                            result_logs.append(ResultLogError(
+                                no_peb=request.no_peb,
+                                no_seri=request.no_seri,
+                                original_description=request.original_description,
+                                error=str(error)
+                            ))
+                            continue
+
+                        agent_results = None
+                        if request_description in combined_results:
+                            identification, shared = combined_results[request_description]
+                            flag, fish_name_english, fish_name_latin, agent_results = identification
+                            repeated = shared or request_description in seen_descriptions
+                            from_cache = flag and repeated
+                            if key in cached_results:
+                                fish_name_english, fish_name_latin, _, _ = cached_results[key]
+                                flag, from_cache = True, repeated
+                            if repeated:
+                                agent_results = None
+                        elif key in cached_results:
+                            fish_name_english, fish_name_latin, _, _ = cached_results[key]
+                            flag, from_cache = True, True
+                        else:
+                            identification, shared = identified[key]
+                            flag, fish_name_english, fish_name_latin, agent_results = identification
+                            # Repeats of a name identified earlier in this batch, or by a concurrent
+                            # request, are served as cache hits
+                            from_cache = flag and (shared or key in seen_keys)
+                            if shared or key in seen_keys:
+                                agent_results = None
+
+                        result_logs.append(await self.save_result_log(
+                            db,
+                            original_description=request.original_description,
+                            no_peb=request.no_peb,
+                            no_seri=request.no_seri,
+                            extracted_fish_name=extracted_fish_name,
+                            fish_name_english=fish_name_english,
+                            fish_name_latin=fish_name_latin,
+                            flag=flag,
+                            from_cache=from_cache,
+                            agent_results=agent_results,
+                            # The extraction call is recorded against the first request with the description
+                            extraction_usage=extraction_usage if request_description not in seen_descriptions else None,
+                            extracted_by_agents=request_description in combined_results
+                                and request_description not in seen_descriptions
+                        ))
+                        seen_descriptions.add(request_description)
+                        seen_keys.add(key)
+
+                    if on_saved is not None:
+                        await on_saved(db, result_logs)
+                    await self.audit_service.update_counters(db)
+                    await db.commit()
+            return result_logs
         except Exception as e:
-            raise Exception(f"Error in processing result log: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error in processing result log batch: {str(e)}")
@@ -2,10 +2,94 @@ AGENT_EXTRACT_TEXT = "openai/gpt-4.1"
 AGENT1 = "openai/gpt-4.1"
 AGENT2 = "anthropic/claude-3.7-sonnet"
 AGENT3 = "deepseek/deepseek-chat-v3-0324"
+# Identification agents, each with one vote unless weighted in AGENT_WEIGHTS
+AGENTS = [AGENT1, AGENT2, AGENT3]
+AGENT_WEIGHTS = {}
+# Approximate USD per million input tokens, orders the agents when CONSENSUS_ORDER is "cost"
+AGENT_COSTS = {
+    AGENT1: 2.0,
+    AGENT2: 3.0,
+    AGENT3: 0.27,
+}
+# "parallel" (default) runs every agent at once; "escalate" runs the CONSENSUS_INITIAL_AGENTS cheapest
+# ("cost") or fastest ("latency") agents first and adds one more agent at a time while they disagree
+CONSENSUS_MODE = "parallel"
+CONSENSUS_ORDER = "cost"
+CONSENSUS_INITIAL_AGENTS = 2
+CONSENSUS_MIN_VOTES = 2  # weighted votes a latin name needs to be agreed on
+# "two_step" extracts the fish name with AGENT_EXTRACT_TEXT and identifies it with the agents;
+# "combined" skips the extraction call and the agents extract and identify in one call (prompt/agent_combined.md)
+PIPELINE_MODE = "two_step"
+# Fallback model per agent, used when the agent fails or is slower than HEDGE_PERCENTILE of its recent calls
+AGENT_FALLBACKS = {
+    AGENT1: "openai/gpt-4.1-mini",
+    AGENT2: "anthropic/claude-3.5-haiku",
+    AGENT3: "google/gemini-2.0-flash-001",
+}
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20  # recent calls of a model needed before its calls are hedged
+LATENCY_WINDOW_SIZE = 200  # recent agent call latencies kept per model and pipeline mode
 LIMIT = 5
+BATCH_CONCURRENCY = 5
+AUDIT_SNAPSHOT_INTERVAL = 300  # seconds between audit_log snapshots
 
+# Log listing
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_YIELD_PER = 500  # rows fetched per round trip when streaming NDJSON
 
+# Job queue
+JOB_WORKERS = 4
+JOB_POLL_INTERVAL = 1.0  # seconds an idle worker waits before checking for jobs again
+JOB_LEASE_TIMEOUT = 600  # seconds after which a running job is considered abandoned and retried
+JOB_MAX_ATTEMPTS = 3
 
+# Bulk import
+IMPORT_BATCH_SIZE = 100  # records written per transaction and checkpoint
+IMPORT_REJECTS_SUFFIX = ".rejects.jsonl"  # appended to the imported file's path for rejected records
 
+# In-memory LRU tier in front of cache_log
+CACHE_MEMORY_MAXSIZE = 1024
+CACHE_MEMORY_TTL = 3600  # seconds
 
+# Dictionary fast-path extractor built from cache_log names
+DICTIONARY_EXTRACTION = True
+DICTIONARY_REFRESH_INTERVAL = 60  # seconds
 
+# Fuzzy cache lookup on normalized fish names (pg_trgm similarity, must be >= 0.3 on Postgres).
+# Each word must also reach the threshold, so only spelling variants of the same words match.
+FUZZY_CACHE_LOOKUP = True
+FUZZY_CACHE_THRESHOLD = 0.7
+
+# Shared LLM HTTP client connection pool
+LLM_HTTP2 = True
+LLM_MAX_CONNECTIONS = 20
+LLM_MAX_KEEPALIVE_CONNECTIONS = 10
+LLM_KEEPALIVE_EXPIRY = 30.0
+
+# LLM call timeouts in seconds, (connect, read) per model with defaults for unlisted models
+LLM_CONNECT_TIMEOUT = 5.0
+LLM_READ_TIMEOUT = 60.0
+LLM_MODEL_TIMEOUTS = {
+    AGENT3: (5.0, 90.0),
+}
+
+# LLM call retries with jittered exponential backoff; Retry-After is honoured up to LLM_RETRY_MAX_DELAY
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BASE_DELAY = 0.5  # seconds
+LLM_RETRY_MAX_DELAY = 8.0  # seconds
+LLM_RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# Client-side rate limits per model, off by default: calls only wait out the pauses asked for by
+# 429 responses and rate limit headers. Set the provider's limits to also queue calls, e.g.
+# {AGENT1: {"rate": 10.0, "burst": 20, "max_in_flight": 20}} (requests per second, burst size,
+# calls in flight at once); LLM_DEFAULT_RATE_LIMIT applies to models not listed
+LLM_RATE_LIMITS = {}
+LLM_DEFAULT_RATE_LIMIT = {}
+
+# Per-model circuit breaker: open after this many failed calls in a row, try again after the reset timeout
+LLM_BREAKER_FAILURE_THRESHOLD = 5
+LLM_BREAKER_RESET_TIMEOUT = 30.0  # seconds
+
+# Prometheus metrics served at /metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
@@ -1,12 +1,41 @@
 import os
-import requests
+import time
+import random
+import asyncio
+import logging
+import httpx
 from dotenv import load_dotenv
+from app.util.llm_client import get_llm_client
+from app.util.metrics import llm_request_duration, llm_errors, llm_retries, llm_queue_wait, llm_queue_depth, llm_in_flight
+from app.util.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.util.rate_limiter import RateLimiter
+from app.schema.usage import LLMUsage
+from app.setting.setting import (
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_MODEL_TIMEOUTS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_RETRYABLE_STATUSES,
+    LLM_BREAKER_FAILURE_THRESHOLD,
+    LLM_BREAKER_RESET_TIMEOUT,
+    LLM_RATE_LIMITS,
+    LLM_DEFAULT_RATE_LIMIT,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 api_key = os.getenv("OPENROUTER_API_KEY")
 api_base = os.getenv("OPENROUTER_API_BASE")
 
+circuit_breakers: dict[str, CircuitBreaker] = {}
+rate_limiters: dict[str, RateLimiter] = {}
+llm_queue_depth.collect = lambda: {(model,): limiter.waiting for model, limiter in rate_limiters.items()}
+llm_in_flight.collect = lambda: {(model,): limiter.in_flight for model, limiter in rate_limiters.items()}
+
 def create_llm_request(prompt: str, model: str) -> dict:
     """
     Create a standardized LLM API request.
@@ -19,7 +48,9 @@ def create_llm_request(prompt: str, model: str) -> dict:
         "messages": [
             {"role": "system", "content": "You are a helpful assistant"},
             {"role": "user", "content": prompt}
-        ]
+        ],
+        # Ask OpenRouter to include the cost of the call in the usage block
+        "usage": {"include": True}
     }
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -33,17 +64,122 @@ def create_llm_request(prompt: str, model: str) -> dict:
         "headers": headers
     }
 
-def make_llm_request(request_data: dict) -> dict:
+def get_usage(response: dict, model: str) -> LLMUsage:
     """
-    Make an LLM API request and return the response.
+    Read token counts and cost from the usage block of an LLM response.
+    Fields the provider did not report are left empty.
     """
+    usage = response.get("usage") or {}
+    return LLMUsage(
+        model=model,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        cost=usage.get("cost")
+    )
+
+def get_circuit_breaker(model: str) -> CircuitBreaker:
+    """Return the circuit breaker of a model, creating it on first use."""
+    breaker = circuit_breakers.get(model)
+    if breaker is None:
+        breaker = circuit_breakers[model] = CircuitBreaker(LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_TIMEOUT)
+    return breaker
+
+def get_circuit_breaker_stats(models: list[str]) -> dict:
+    """Get the breaker state and counters of the given models and any other model called so far."""
+    return {model: get_circuit_breaker(model).stats() for model in dict.fromkeys([*models, *circuit_breakers])}
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Return the rate limiter of a model from LLM_RATE_LIMITS, creating it on first use."""
+    limiter = rate_limiters.get(model)
+    if limiter is None:
+        limiter = rate_limiters[model] = RateLimiter(**LLM_RATE_LIMITS.get(model, LLM_DEFAULT_RATE_LIMIT))
+    return limiter
+
+def get_rate_limiter_stats(models: list[str]) -> dict:
+    """Get the current rate, queue depth and calls in flight of the given models and any other model called so far."""
+    return {model: get_rate_limiter(model).stats() for model in dict.fromkeys([*models, *rate_limiters])}
+
+def get_timeout(model: str) -> httpx.Timeout:
+    connect_timeout, read_timeout = LLM_MODEL_TIMEOUTS.get(model, (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+    return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+def get_retry_after(response: httpx.Response) -> float | None:
+    """Seconds to wait from a Retry-After header given in seconds, None if absent or a date."""
     try:
-        response = requests.post(
-            request_data["url"],
-            json=request_data["payload"],
-            headers=request_data["headers"]
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        raise Exception(f"Error making LLM request: {str(e)}") 
\ No newline at end of file
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+async def make_llm_request(request_data: dict) -> dict:
+    """
+    Make an LLM API request through the shared pooled client and return the response.
+    Timeouts, connection errors and LLM_RETRYABLE_STATUSES are retried up to LLM_MAX_RETRIES
+    times with jittered exponential backoff, and calls to a model whose circuit breaker
+    is open fail fast with CircuitOpenError. Calls wait their turn in the model's rate limiter, which adapts
+    to 429 responses and rate limit headers.
+    """
+    model = request_data["payload"]["model"]
+    breaker = get_circuit_breaker(model)
+    limiter = get_rate_limiter(model)
+    timeout = get_timeout(model)
+
+    def on_response(response: httpx.Response) -> None:
+        limiter.record_response(response.status_code, response.headers, get_retry_after(response))
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if not breaker.allow():
+            llm_errors.inc(model=model, status="circuit_open")
+            raise CircuitOpenError(f"Error making LLM request: circuit breaker for {model} is open")
+
+        retry_after = None
+        try:
+            async with limiter.acquire() as waited:
+                llm_queue_wait.observe(waited, model=model)
+                start = time.perf_counter()
+                response = await get_llm_client().post(
+                    request_data["url"],
+                    request_data["payload"],
+                    request_data["headers"],
+                    timeout,
+                    on_response
+                )
+            breaker.record_success()
+            llm_request_duration.observe(time.perf_counter() - start, model=model)
+            return response
+        except httpx.HTTPStatusError as e:
+            llm_errors.inc(model=model, status=e.response.status_code)
+            logger.error(f"Response status code: {e.response.status_code}")
+            logger.error(f"Response text: {e.response.text}")
+            if e.response.status_code not in LLM_RETRYABLE_STATUSES:
+                # The request itself is wrong, which says nothing about the model's health
+                breaker.release()
+                raise Exception(f"Error making LLM request: {str(e)}")
+            if e.response.status_code == 429:
+                # Throttled rather than unhealthy, the rate limiter backs off instead
+                breaker.release()
+            else:
+                breaker.record_failure()
+            error = e
+            retry_after = get_retry_after(e.response)
+        except httpx.TransportError as e:
+            llm_errors.inc(model=model, status=type(e).__name__)
+            breaker.record_failure()
+            error = e
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            llm_errors.inc(model=model, status=type(e).__name__)
+            breaker.release()
+            raise Exception(f"Error making LLM request: {str(e)}")
+
+        if attempt == LLM_MAX_RETRIES:
+            break
+        if retry_after is None:
+            retry_after = random.uniform(0, LLM_RETRY_BASE_DELAY * 2 ** attempt)
+        delay = min(retry_after, LLM_RETRY_MAX_DELAY)
+        llm_retries.inc(model=model)
+        logger.warning(f"LLM request to {model} failed: {str(error) or type(error).__name__}. Retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.2f}s.")
+        await asyncio.sleep(delay)
+
+    raise Exception(f"Error making LLM request: {str(error) or type(error).__name__}")
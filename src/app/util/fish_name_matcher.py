@@ -0,0 +1,59 @@
+from app.util.text_utils import tokenize_description, is_stop_token
+
+class FishNameMatcher:
+    """
+    Multi-pattern matcher over known fish names.
+    Names are stored in a token trie, so new names can be added incrementally and
+    a description is scanned in a single pass using the longest match at each position.
+    """
+    _END = object()
+
+    def __init__(self):
+        self._trie: dict = {}
+        self.size = 0
+
+    def add(self, fish_name: str) -> None:
+        """Add a known fish name; names made only of stop tokens are ignored."""
+        tokens = tokenize_description(fish_name)
+        if not tokens or all(is_stop_token(token) for token in tokens):
+            return
+
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if self._END not in node:
+            node[self._END] = fish_name
+            self.size += 1
+
+    def match(self, description: str) -> str | None:
+        """
+        Return the known fish name in the description if the match is unambiguous:
+        exactly one distinct name is found and every other token is a quantity,
+        unit or packaging word. Otherwise return None.
+        """
+        tokens = tokenize_description(description)
+        matches = set()
+        position = 0
+
+        while position < len(tokens):
+            node = self._trie
+            longest = None
+            index = position
+            while index < len(tokens) and tokens[index] in node:
+                node = node[tokens[index]]
+                index += 1
+                if self._END in node:
+                    longest = (index, node[self._END])
+
+            if longest:
+                position, fish_name = longest
+                matches.add(fish_name)
+            elif is_stop_token(tokens[position]):
+                position += 1
+            else:
+                # Unknown word, the description may name something the dictionary does not know
+                return None
+
+        if len(matches) != 1:
+            return None
+        return matches.pop()
@@ -0,0 +1,28 @@
+import math
+from collections import deque
+from typing import Hashable
+
+class LatencyWindow:
+    """Rolling window of the most recent call latencies per key, e.g. per model and call type."""
+    def __init__(self, size: int):
+        self.size = size
+        self.samples: dict[Hashable, deque[float]] = {}
+
+    def record(self, key: Hashable, seconds: float) -> None:
+        window = self.samples.get(key)
+        if window is None:
+            window = self.samples[key] = deque(maxlen=self.size)
+        window.append(seconds)
+
+    def percentile(self, key: Hashable, q: float, min_samples: int = 1) -> float | None:
+        """
+        Nearest-rank percentile of the recent latencies of key.
+
+        Returns:
+            Seconds, or None while fewer than min_samples latencies are recorded
+        """
+        window = self.samples.get(key)
+        if window is None or len(window) < max(1, min_samples):
+            return None
+        ordered = sorted(window)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
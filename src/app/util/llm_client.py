@@ -0,0 +1,80 @@
+import logging
+import httpx
+from typing import Callable
+
+from app.setting.setting import (
+    LLM_HTTP2,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+def _http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class LLMClient:
+    """
+    Pooled async HTTP client shared by every OpenRouter call.
+    Keeps keep-alive connections open so repeated calls skip the TCP and TLS handshake.
+    """
+    def __init__(self):
+        http2 = LLM_HTTP2 and _http2_available()
+        if LLM_HTTP2 and not http2:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1.")
+
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info(f"LLMClient initialized (http2={http2}, max_connections={LLM_MAX_CONNECTIONS}).")
+
+    async def post(
+        self,
+        url: str,
+        payload: dict,
+        headers: dict,
+        timeout: httpx.Timeout | None = None,
+        on_response: Callable[[httpx.Response], None] | None = None
+    ) -> dict:
+        """
+        Send a chat completion request and return the decoded JSON response.
+        on_response is called with every response, e.g. to read rate limit headers, before errors are raised.
+        """
+        response = await self.client.post(url, json=payload, headers=headers, timeout=timeout or self.client.timeout)
+        if on_response is not None:
+            on_response(response)
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+_client: LLMClient | None = None
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLM client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = LLMClient()
+    return _client
+
+async def close_llm_client() -> None:
+    """Close the process-wide LLM client and release its connections."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,200 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from app.setting.setting import METRICS_LATENCY_BUCKETS
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labelnames: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set, e.g. {model="a",status="500"}."""
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+class Gauge:
+    """
+    Value that can go up and down, with optional labels. Set collect to a function
+    returning the current values by label tuple to read them at scrape time instead.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple[str, ...], float] = {}
+        self.collect: Callable[[], dict[tuple[str, ...], float]] | None = None
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[tuple(str(labels[name]) for name in self.labelnames)] = value
+
+    def samples(self) -> Iterator[str]:
+        values = self.collect() if self.collect is not None else self.values
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}"
+
+class Histogram:
+    """Histogram of observed values in cumulative buckets, with optional labels."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = METRICS_LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        counts, total = self.values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the seconds spent in the block; a block left by an exception is not observed."""
+        start = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = format_labels(self.labelnames, key, f'le="{format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            labels = format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class MetricsRegistry:
+    """Process-wide set of metrics rendered in the Prometheus text exposition format."""
+    def __init__(self):
+        self.metrics: list[Counter | Gauge | Histogram] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+        metric = Histogram(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "finscan_http_request_duration_seconds",
+    "Time to answer an HTTP request by method, route and status code.",
+    ("method", "route", "status")
+)
+stage_duration = registry.histogram(
+    "finscan_stage_duration_seconds",
+    "Time spent in each identification pipeline stage: extraction, consensus, db_read and db_write.",
+    ("stage",)
+)
+llm_request_duration = registry.histogram(
+    "finscan_llm_request_duration_seconds",
+    "Time of successful OpenRouter calls by model.",
+    ("model",)
+)
+llm_queue_wait = registry.histogram(
+    "finscan_llm_queue_wait_seconds",
+    "Time OpenRouter calls waited for the client-side rate limiter, by model.",
+    ("model",)
+)
+llm_queue_depth = registry.gauge(
+    "finscan_llm_queue_depth",
+    "OpenRouter calls waiting for the client-side rate limiter, by model.",
+    ("model",)
+)
+llm_in_flight = registry.gauge(
+    "finscan_llm_in_flight",
+    "OpenRouter calls in flight, by model.",
+    ("model",)
+)
+llm_errors = registry.counter(
+    "finscan_llm_errors_total",
+    "Failed OpenRouter calls by model and HTTP status, or the error type when no response arrived.",
+    ("model", "status")
+)
+llm_retries = registry.counter(
+    "finscan_llm_retries_total",
+    "OpenRouter calls retried after a timeout, connection error or retryable status, by model.",
+    ("model",)
+)
+llm_fallbacks = registry.counter(
+    "finscan_llm_fallbacks_total",
+    "Agent calls sent to the fallback model, by agent model and reason (hedge or error) and the model that answered.",
+    ("model", "reason", "winner")
+)
+cache_lookups = registry.counter(
+    "finscan_cache_lookups_total",
+    "Description (extraction) and fish name (result) cache lookups by outcome.",
+    ("cache", "result")
+)
+consensus_runs = registry.counter(
+    "finscan_consensus_runs_total",
+    "Agent consensus runs by mode and outcome: agreed by the initial agents, agreed after escalating on disagreement, or disagreed.",
+    ("mode", "outcome")
+)
+consensus_added_agents = registry.counter(
+    "finscan_consensus_added_agents_total",
+    "Agents started after the initial ones, by mode and reason: disagreement, or replacing an agent that failed.",
+    ("mode", "reason")
+)
+agent_agreements = registry.counter(
+    "finscan_agent_agreements_total",
+    "Agent consensus runs by outcome: agreed or disagreed.",
+    ("result",)
+)
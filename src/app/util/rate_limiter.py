@@ -0,0 +1,142 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Mapping
+
+logger = logging.getLogger(__name__)
+
+# Share of the configured rate regained per successful call after a 429 halved it
+RATE_RECOVERY_STEP = 0.05
+
+def parse_reset(value: str, now: float) -> float | None:
+    """
+    Seconds until a rate limit window resets, from an X-RateLimit-Reset value given
+    as a Unix timestamp in milliseconds or seconds, or as a number of seconds.
+    """
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    if reset > 1e12:
+        return max(0.0, reset / 1000 - now)
+    if reset > 1e9:
+        return max(0.0, reset - now)
+    return max(0.0, reset)
+
+class RateLimiter:
+    """
+    Token bucket and in-flight limit for the calls to one model.
+    Callers wait in a FIFO queue instead of failing: the caller at the head of the queue
+    waits for a free in-flight slot and a token, the others wait behind it.
+    A 429 pauses the bucket for Retry-After and halves the rate, which then recovers
+    step by step with every successful call; rate limit headers reporting no remaining
+    requests pause the bucket until the reported reset.
+    Without a rate or max_in_flight that limit is off, and calls only wait out pauses.
+    """
+    def __init__(self, rate: float | None = None, burst: int | None = None, max_in_flight: int | None = None):
+        self.configured_rate = rate
+        self.rate = rate
+        self.burst = burst or 1
+        self.max_in_flight = max_in_flight
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.queue = asyncio.Lock()
+        self.slots = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        self.waiting = 0
+        self.in_flight = 0
+        self.rate_limited = 0
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if self.rate is None:
+            self.updated_at = now
+            return
+        # No tokens accrue while paused
+        refill_from = max(self.updated_at, self.paused_until)
+        if now > refill_from:
+            self.tokens = min(self.burst, self.tokens + (now - refill_from) * self.rate)
+        self.updated_at = now
+
+    async def take_token(self) -> None:
+        while True:
+            self.refill()
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+            elif self.rate is None:
+                return
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                return
+            else:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[float]:
+        """Wait for a turn to call the model; yields the seconds spent waiting."""
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self.queue:
+                if self.slots is not None:
+                    await self.slots.acquire()
+                try:
+                    await self.take_token()
+                except BaseException:
+                    if self.slots is not None:
+                        self.slots.release()
+                    raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield time.monotonic() - started
+        finally:
+            self.in_flight -= 1
+            if self.slots is not None:
+                self.slots.release()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def record_response(self, status_code: int, headers: Mapping[str, str], retry_after: float | None = None) -> None:
+        """Adapt to a response: back off on 429, follow rate limit headers, recover the rate on success."""
+        if status_code == 429 and self.configured_rate is None:
+            self.rate_limited += 1
+            self.pause(retry_after if retry_after is not None else 1.0)
+            logger.warning(f"Rate limited, pausing for {self.paused_until - time.monotonic():.2f}s.")
+        elif status_code == 429:
+            self.rate_limited += 1
+            self.rate = max(self.configured_rate / 10, self.rate / 2)
+            self.pause(retry_after if retry_after is not None else 1 / self.rate)
+            logger.warning(f"Rate limited, pausing for {self.paused_until - time.monotonic():.2f}s at {self.rate:.2f} requests/s.")
+        elif status_code < 400 and self.configured_rate is not None:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate * RATE_RECOVERY_STEP)
+
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is not None and reset is not None:
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                exhausted = False
+            wait = parse_reset(reset, time.time()) if exhausted else None
+            if wait:
+                self.pause(wait)
+
+    def stats(self) -> dict:
+        self.refill()
+        return {
+            "rate": self.rate,
+            "configured_rate": self.configured_rate,
+            "tokens": round(self.tokens, 2) if self.rate is not None else None,
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rate_limited": self.rate_limited,
+        }
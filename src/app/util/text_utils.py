@@ -1,4 +1,5 @@
 import re
+import unicodedata
 
 def normalize_latin_name(name: str) -> str:
     """
@@ -32,4 +33,67 @@ def clean_json_content(content: str) -> str:
     """
     Clean JSON content by removing markdown code blocks and extra whitespace.
     """
-    return content.replace('```json', '').replace('```', '').strip() 
\ No newline at end of file
+    return content.replace('```json', '').replace('```', '').strip()
+
+UNIT_TOKENS = {
+    'kg', 'kgs', 'kilo', 'kilogram', 'kilograms', 'g', 'gr', 'gram', 'grams', 'gramm',
+    'mg', 'ton', 'tons', 'mt', 'lb', 'lbs', 'oz', 'l', 'ltr', 'liter', 'litre', 'ml',
+    'pc', 'pcs', 'piece', 'pieces', 'ekor', 'x'
+}
+
+# Packaging, processing and generic "fish" words that never name a species
+PACKAGING_TOKENS = {
+    'box', 'boxes', 'carton', 'cartons', 'ctn', 'pack', 'packs', 'package', 'bag', 'bags',
+    'block', 'blocks', 'can', 'cans', 'tray', 'sack', 'karung', 'dus', 'kotak', 'per', 'each',
+    'frozen', 'beku', 'fresh', 'segar', 'whole', 'utuh', 'entier', 'congele', 'surgele',
+    'ikan', 'iwak', 'fish', 'poisson', 'pescado', 'pesce'
+}
+
+QUANTITY_PATTERN = re.compile(r'^\d+(?:[.,/x]\d+)*[a-z]*$')
+
+def normalize_description(description: str) -> str:
+    """
+    Normalize a product description for description-level caching.
+    - Convert to lowercase
+    - Remove punctuation and extra spaces
+    - Remove quantities (e.g. 10, 2kg, 1.5) and unit tokens (e.g. kg, gram, pcs)
+    """
+    tokens = tokenize_description(description)
+    return ' '.join(token for token in tokens if token not in UNIT_TOKENS and not QUANTITY_PATTERN.match(token))
+
+def tokenize_description(description: str) -> list[str]:
+    """
+    Split a product description into lowercase word tokens without punctuation.
+    Quantity tokens such as 2kg or 1.5 are kept intact.
+    """
+    if not description:
+        return []
+
+    description = re.sub(r'[^\w\s.,/]', ' ', description.lower())
+    return [token for token in (token.strip('.,/') for token in description.split()) if token]
+
+def is_stop_token(token: str) -> bool:
+    """Check whether a token is a quantity, unit or packaging word."""
+    return token in UNIT_TOKENS or token in PACKAGING_TOKENS or bool(QUANTITY_PATTERN.match(token))
+
+FISH_NAME_PREFIXES = {'ikan', 'iwak', 'fish', 'poisson', 'pescado', 'pesce'}
+
+def normalize_fish_name(name: str) -> str:
+    """
+    Canonicalize an extracted fish name for use as a cache key.
+    - Strip diacritics
+    - Convert to lowercase
+    - Remove punctuation and extra spaces
+    - Remove leading generic words such as "ikan" or "fish"
+    """
+    if not name:
+        return ""
+
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    name = re.sub(r'[^\w\s]', ' ', name.lower())
+
+    tokens = name.split()
+    while len(tokens) > 1 and tokens[0] in FISH_NAME_PREFIXES:
+        tokens.pop(0)
+    return ' '.join(tokens)
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from typing import Callable
+
+def trigrams(text: str) -> set[str]:
+    """
+    Split text into trigrams the same way pg_trgm does: every word is padded
+    with two spaces in front and one behind before taking 3-character windows.
+    """
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+def similarity(text: str, other: str) -> float:
+    """Trigram similarity of two texts, computed like pg_trgm's similarity()."""
+    text_trigrams, other_trigrams = trigrams(text), trigrams(other)
+    union = text_trigrams | other_trigrams
+    return len(text_trigrams & other_trigrams) / len(union) if union else 0.0
+
+def is_spelling_variant(name: str, other: str, threshold: float) -> bool:
+    """
+    Whether two normalized names are the same words spelled differently: they have the
+    same number of words and every pair of words is at least threshold similar.
+    Names that share some words but differ in another, like "kakap merah" and
+    "kakap putih", are different species rather than variants.
+    """
+    words, other_words = name.split(), other.split()
+    return len(words) == len(other_words) and all(
+        similarity(word, other_word) >= threshold for word, other_word in zip(words, other_words)
+    )
+
+class TrigramIndex:
+    """
+    In-memory trigram similarity index, used for fuzzy lookups when the database has no pg_trgm.
+    Similarity is computed like pg_trgm's similarity(): shared trigrams / union of trigrams.
+    """
+    def __init__(self):
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._trigrams: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._trigrams)
+
+    def add(self, key: str) -> None:
+        if not key or key in self._trigrams:
+            return
+        key_trigrams = trigrams(key)
+        self._trigrams[key] = key_trigrams
+        for trigram in key_trigrams:
+            self._postings[trigram].add(key)
+
+    def best_match(
+        self, query: str, threshold: float, accept: Callable[[str], bool] | None = None
+    ) -> tuple[str, float] | None:
+        """Return the most similar indexed key accepted by accept and its similarity, if it reaches threshold."""
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return None
+
+        shared: dict[str, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for key in self._postings.get(trigram, ()):
+                shared[key] += 1
+
+        best = None
+        for key, count in shared.items():
+            similarity = count / (len(query_trigrams) + len(self._trigrams[key]) - count)
+            if similarity >= threshold and (best is None or similarity > best[1]) and (accept is None or accept(key)):
+                best = (key, similarity)
+        return best
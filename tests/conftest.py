@@ -0,0 +1,8 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# Read at import time by the services; no request leaves the tests
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("OPENROUTER_API_BASE", "http://openrouter.invalid")
@@ -0,0 +1,152 @@
+import json
+import asyncio
+
+import pytest
+
+import app.core.fish_identification_service as fish_identification
+from app.core.fish_identification_service import FishIdentificationService
+from app.util.metrics import consensus_runs, consensus_added_agents
+
+AGENTS = ["cheap", "medium", "expensive"]
+
+def response(model: str, latin_name: str) -> dict:
+    # Models echo an agent name of their own, which must not affect the vote
+    content = json.dumps({
+        "agent": f"echo of {model}",
+        "fish_common_name": "Tuna",
+        "latin_name": latin_name,
+        "reasoning": "test"
+    })
+    return {"choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(fish_identification, "AGENTS", AGENTS)
+    monkeypatch.setattr(fish_identification, "AGENT_COSTS", {"cheap": 1.0, "medium": 2.0, "expensive": 3.0})
+    monkeypatch.setattr(fish_identification, "AGENT_WEIGHTS", {})
+    monkeypatch.setattr(fish_identification, "CONSENSUS_MODE", "escalate")
+    monkeypatch.setattr(fish_identification, "CONSENSUS_ORDER", "cost")
+    monkeypatch.setattr(fish_identification, "CONSENSUS_INITIAL_AGENTS", 2)
+    monkeypatch.setattr(fish_identification, "CONSENSUS_MIN_VOTES", 2)
+    consensus_runs.values.clear()
+    consensus_added_agents.values.clear()
+    return FishIdentificationService()
+
+def fake_agents(service, monkeypatch, answers: dict) -> list[str]:
+    """
+    Replace call_agent with canned answers per model: a latin name, an exception,
+    or a (model that answered, latin name) tuple for a hedged call.
+    Returns the models in the order they were called.
+    """
+    called = []
+
+    async def call_agent(model, input_text, combined=False, cancelled_calls=None):
+        called.append(model)
+        await asyncio.sleep(0)
+        answer = answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        answered_model, latin_name = answer if isinstance(answer, tuple) else (model, answer)
+        return answered_model, response(answered_model, latin_name)
+
+    monkeypatch.setattr(service, "call_agent", call_agent)
+    return called
+
+def test_escalate_starts_with_the_cheapest_agents(service, monkeypatch):
+    monkeypatch.setattr(fish_identification, "AGENT_COSTS", {"cheap": 3.0, "medium": 1.0, "expensive": 2.0})
+    called = fake_agents(service, monkeypatch, {
+        "cheap": "Thunnus albacares",
+        "medium": "Thunnus albacares",
+        "expensive": "Thunnus albacares",
+    })
+
+    results = asyncio.run(service.run_agents("tuna"))
+
+    assert called == ["medium", "expensive"]
+    assert results[0] is None
+    assert consensus_runs.values == {("escalate", "agreed"): 1}
+    assert consensus_added_agents.values == {}
+
+def test_escalate_adds_an_agent_on_disagreement(service, monkeypatch):
+    called = fake_agents(service, monkeypatch, {
+        "cheap": "Thunnus albacares",
+        "medium": "Katsuwonus pelamis",
+        "expensive": "Katsuwonus pelamis",
+    })
+
+    results = asyncio.run(service.run_agents("tuna"))
+
+    assert called == ["cheap", "medium", "expensive"]
+    assert [result.latin_name for result in results] == ["Thunnus albacares", "Katsuwonus pelamis", "Katsuwonus pelamis"]
+    assert consensus_runs.values == {("escalate", "agreed_escalated"): 1}
+    assert consensus_added_agents.values == {("escalate", "disagreement"): 1}
+
+def test_failed_agent_is_replaced_without_counting_as_escalation(service, monkeypatch):
+    called = fake_agents(service, monkeypatch, {
+        "cheap": "Thunnus albacares",
+        "medium": Exception("timeout"),
+        "expensive": "Thunnus albacares",
+    })
+
+    results = asyncio.run(service.run_agents("tuna"))
+
+    assert called == ["cheap", "medium", "expensive"]
+    assert results[1] is None
+    assert consensus_runs.values == {("escalate", "agreed"): 1}
+    assert consensus_added_agents.values == {("escalate", "error"): 1}
+
+def test_all_agents_failing_raises(service, monkeypatch):
+    fake_agents(service, monkeypatch, {model: Exception("down") for model in AGENTS})
+
+    with pytest.raises(Exception, match="Error running agents"):
+        asyncio.run(service.run_agents("tuna"))
+
+def test_votes_are_weighted_by_the_called_agent(service, monkeypatch):
+    monkeypatch.setattr(fish_identification, "AGENT_WEIGHTS", {"cheap": 2.0})
+    # The fallback answered for the heavy agent, its vote keeps the agent's weight
+    called = fake_agents(service, monkeypatch, {
+        "cheap": ("cheap-fallback", "Thunnus albacares"),
+        "medium": "Katsuwonus pelamis",
+        "expensive": "Katsuwonus pelamis",
+    })
+
+    results = asyncio.run(service.run_agents("tuna"))
+
+    assert called == ["cheap", "medium"]
+    assert results[0].agent == "cheap-fallback"
+    flag, _, latin_name, _ = service.check_agent_agreement(results)
+    assert flag
+    assert latin_name == "Thunnus albacares"
+
+def test_weighted_agreement_needs_min_votes(service, monkeypatch):
+    monkeypatch.setattr(fish_identification, "AGENT_WEIGHTS", {"cheap": 0.5, "medium": 1.0})
+    results = [
+        service.extract_agent_content(response("cheap", "Thunnus albacares"), "cheap"),
+        service.extract_agent_content(response("medium", "Thunnus albacares"), "medium"),
+        None,
+    ]
+
+    flag, _, latin_name, _ = service.check_agent_agreement(results)
+
+    assert not flag
+    assert latin_name == "Thunnus albacares"
+
+def test_combined_answer_without_extracted_name_fails_the_agent(service, monkeypatch):
+    called = []
+
+    async def call_agent(model, input_text, combined=False, cancelled_calls=None):
+        called.append(model)
+        answer = response(model, "Thunnus albacares")
+        if model != "cheap":
+            content = json.loads(answer["choices"][0]["message"]["content"])
+            answer["choices"][0]["message"]["content"] = json.dumps({**content, "extracted_fish_name": "tuna"})
+        return model, answer
+
+    monkeypatch.setattr(service, "call_agent", call_agent)
+
+    results = asyncio.run(service.run_agents("Frozen tuna 10kg", combined=True))
+
+    assert called == ["cheap", "medium", "expensive"]
+    assert results[0] is None
+    assert service.check_agent_agreement(results)[3] == "tuna"
+    assert consensus_added_agents.values == {("escalate", "error"): 1}